@@ -0,0 +1,189 @@
+import csv
+import io
+import json
+from typing import Iterable, Iterator, Tuple
+
+try:
+    from app.models import InvoiceData
+except ImportError:
+    from models import InvoiceData
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# Rows are buffered and written in chunks of this size, so memory use does not
+# depend on the size of the export
+CHUNK_ROWS = 1000
+
+# One row per line item, with the invoice-level fields repeated
+INVOICE_COLUMNS = [
+    ("invoice_id", "string"),
+    ("invoice_number", "string"),
+    ("invoice_date", "string"),
+    ("due_date", "string"),
+    ("purchase_order_number", "string"),
+    ("currency", "string"),
+    ("subtotal", "double"),
+    ("tax", "double"),
+    ("shipping", "double"),
+    ("total", "double"),
+    ("amount_due", "double"),
+    ("vendor_name", "string"),
+    ("vendor_tax_id", "string"),
+    ("customer_name", "string"),
+    ("customer_account_number", "string"),
+    ("confidence_warning", "bool"),
+    ("discrepancy_detected", "bool"),
+]
+LINE_ITEM_COLUMNS = [
+    ("line_item_index", "int64"),
+    ("description", "string"),
+    ("quantity", "double"),
+    ("unit_price", "double"),
+    ("total_price", "double"),
+    ("product_code", "string"),
+    ("tax_rate", "double"),
+    ("category", "string"),
+]
+EXPORT_COLUMNS = INVOICE_COLUMNS + LINE_ITEM_COLUMNS
+
+
+def flatten_invoice(invoice_id: str, invoice: InvoiceData) -> Iterator[dict]:
+    """Flatten an invoice into one row per line item (or a single row if it has none)."""
+    base = {
+        "invoice_id": invoice_id,
+        "invoice_number": invoice.invoice_number,
+        "invoice_date": invoice.invoice_date,
+        "due_date": invoice.due_date,
+        "purchase_order_number": invoice.purchase_order_number,
+        "currency": invoice.currency,
+        "subtotal": invoice.subtotal,
+        "tax": invoice.tax,
+        "shipping": invoice.shipping,
+        "total": invoice.total,
+        "amount_due": invoice.amount_due,
+        "vendor_name": invoice.vendor.name,
+        "vendor_tax_id": invoice.vendor.tax_id,
+        "customer_name": invoice.customer.name,
+        "customer_account_number": invoice.customer.account_number,
+        "confidence_warning": invoice.flags.confidence_warning,
+        "discrepancy_detected": invoice.flags.discrepancy_detected,
+    }
+    if not invoice.line_items:
+        yield {**base, **{name: None for name, _ in LINE_ITEM_COLUMNS}}
+        return
+
+    for index, item in enumerate(invoice.line_items):
+        yield {
+            **base,
+            "line_item_index": index,
+            "description": item.description,
+            "quantity": item.quantity,
+            "unit_price": item.unit_price,
+            "total_price": item.total_price,
+            "product_code": item.product_code,
+            "tax_rate": item.tax_rate,
+            "category": item.category,
+        }
+
+
+def _chunks(rows: Iterable[dict]) -> Iterator[list]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= CHUNK_ROWS:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def stream_csv(selected: Iterable[Tuple[str, InvoiceData]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=[name for name, _ in EXPORT_COLUMNS])
+    writer.writeheader()
+    rows = (row for invoice_id, invoice in selected for row in flatten_invoice(invoice_id, invoice))
+    for chunk in _chunks(rows):
+        writer.writerows(chunk)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def stream_jsonl(selected: Iterable[Tuple[str, InvoiceData]]) -> Iterator[bytes]:
+    """One full invoice record per line, with its id."""
+    lines = []
+    for invoice_id, invoice in selected:
+        lines.append(
+            b'{"invoice_id":' + json.dumps(invoice_id).encode()
+            + b',"invoice":' + invoice.model_dump_json().encode() + b"}\n"
+        )
+        if len(lines) >= CHUNK_ROWS:
+            yield b"".join(lines)
+            lines = []
+    if lines:
+        yield b"".join(lines)
+
+
+class _DrainableSink(io.RawIOBase):
+    """Write-only file object whose contents can be drained between row groups."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def stream_parquet(selected: Iterable[Tuple[str, InvoiceData]]) -> Iterator[bytes]:
+    """Write one Parquet row group per chunk of rows. Requires pyarrow."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {"string": pa.string(), "double": pa.float64(), "int64": pa.int64(), "bool": pa.bool_()}
+    schema = pa.schema([(name, types[kind]) for name, kind in EXPORT_COLUMNS])
+    sink = _DrainableSink()
+    writer = pq.ParquetWriter(sink, schema)
+    rows = (row for invoice_id, invoice in selected for row in flatten_invoice(invoice_id, invoice))
+    for chunk in _chunks(rows):
+        writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def stream_export(export_format: str, selected: Iterable[Tuple[str, InvoiceData]]) -> Iterator[bytes]:
+    if export_format == "csv":
+        return stream_csv(selected)
+    if export_format == "jsonl":
+        return stream_jsonl(selected)
+    if export_format == "parquet":
+        return stream_parquet(selected)
+    raise ValueError(f"Unsupported export format: {export_format}")
@@ -0,0 +1,404 @@
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Dict, Optional
+
+import openai
+
+# Rough size of an image in prompt tokens, used only for rate limiting
+IMAGE_TOKEN_ESTIMATE = 1000
+
+# Lane used by callers that don't name one
+DEFAULT_LANE = "default"
+
+
+class LLMUnavailableError(Exception):
+    """
+    The API could not serve a call right now; the caller should report the
+    failure and try again later rather than fall back to other data.
+    """
+
+    status_code = 503
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(LLMUnavailableError):
+    """Raised without calling the API while a model's circuit breaker is open."""
+
+
+class RetriesExhaustedError(LLMUnavailableError):
+    """Raised when a call still fails with a retryable error after the last retry."""
+
+    def __init__(self, message: str, last_error: Exception, retry_after: Optional[float] = None):
+        super().__init__(message, retry_after)
+        self.last_error = last_error
+        # Report rate limiting as such so clients back off instead of retrying at once
+        if isinstance(last_error, openai.RateLimitError):
+            self.status_code = 429
+
+
+class TokenBucket:
+    """
+    Refills continuously at ``rate_per_minute`` up to one minute's worth of capacity.
+
+    Waiters queue per lane. As tokens refill they go to the lane that has
+    received the fewest tokens relative to its weight (the same stride
+    scheduling as ``LaneScheduler``), so a call in a weight 4 lane does not
+    wait behind a backlog of calls in a weight 1 lane.
+    """
+
+    def __init__(self, rate_per_minute: float, lane_weights: Optional[Dict[str, float]] = None):
+        self.capacity = float(rate_per_minute)
+        self.rate = rate_per_minute / 60.0
+        self.available = self.capacity
+        self.updated = time.monotonic()
+        self.lane_weights = lane_weights or {}
+        self._waiters: Dict[str, deque] = {}
+        # Virtual time per lane; the waiting lane with the lowest value is served next
+        self._pass: Dict[str, float] = {}
+        self._virtual_time = 0.0
+        self._wakeup = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _weight(self, lane: str) -> float:
+        return self.lane_weights.get(lane, 1.0)
+
+    def _charge(self, lane: str, amount: float):
+        self.available -= amount
+        self._virtual_time = self._pass[lane]
+        self._pass[lane] += amount / self._weight(lane)
+
+    def waiting(self) -> Dict[str, int]:
+        return {lane: len(queue) for lane, queue in self._waiters.items() if queue}
+
+    def try_acquire(self, amount: float) -> bool:
+        """Take tokens only if nobody is waiting for them."""
+        if any(self._waiters.values()):
+            return False
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.available >= amount:
+            self.available -= amount
+            return True
+        return False
+
+    async def acquire(self, amount: float, lane: str = DEFAULT_LANE):
+        """Wait until ``amount`` is available, served by lane weight and in arrival order within a lane."""
+        amount = min(amount, self.capacity)
+        queue = self._waiters.setdefault(lane, deque())
+        if not queue:
+            # An idle lane does not bank credit while it has nothing to send
+            self._pass[lane] = max(self._pass.get(lane, 0.0), self._virtual_time)
+
+        if not any(self._waiters.values()):
+            self._refill()
+            if self.available >= amount:
+                self._charge(lane, amount)
+                return
+
+        granted = asyncio.get_running_loop().create_future()
+        queue.append((granted, amount))
+        self._wakeup.set()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        try:
+            await granted
+        except asyncio.CancelledError:
+            # Let the dispatcher stop waiting on this call's behalf
+            self._wakeup.set()
+            raise
+
+    async def _dispatch(self):
+        while True:
+            for queue in self._waiters.values():
+                while queue and queue[0][0].cancelled():
+                    queue.popleft()
+            lanes = [lane for lane, queue in self._waiters.items() if queue]
+            if not lanes:
+                return
+            lane = min(lanes, key=lambda name: (self._pass[name], -self._weight(name)))
+            granted, amount = self._waiters[lane][0]
+
+            self._refill()
+            if self.available >= amount:
+                self._waiters[lane].popleft()
+                self._charge(lane, amount)
+                granted.set_result(None)
+                continue
+
+            # Sleep until the tokens are there, or re-pick if a new waiter arrives first
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), (amount - self.available) / self.rate)
+            except asyncio.TimeoutError:
+                pass
+
+
+class CircuitBreaker:
+    """
+    Opens after ``failure_threshold`` consecutive failures and rejects calls
+    for ``reset_timeout`` seconds, then lets a single trial call through.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def seconds_until_trial(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def p95(self) -> Optional[float]:
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+
+class _ModelState:
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float,
+                 failure_threshold: int, reset_timeout: float, lane_weights: Dict[str, float]):
+        self.requests = TokenBucket(requests_per_minute, lane_weights)
+        self.tokens = TokenBucket(tokens_per_minute, lane_weights)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.latency = LatencyTracker()
+        self.calls = 0
+        self.retries = 0
+        self.hedges = 0
+        self.rejected = 0
+
+
+def estimate_tokens(request: dict) -> int:
+    """Estimate the tokens a chat completion will consume, including its output budget."""
+    characters = 0
+    images = 0
+    for message in request.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, str):
+            characters += len(content)
+        elif isinstance(content, list):
+            for part in content:
+                if part.get("type") == "text":
+                    characters += len(part.get("text", ""))
+                else:
+                    images += 1
+    return characters // 4 + images * IMAGE_TOKEN_ESTIMATE + request.get("max_tokens", 0)
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Read the server's requested delay from a rate limit or overload response."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+    return None
+
+
+class LLMGovernor:
+    """
+    Client-side governor for chat completion calls.
+
+    Per model it enforces requests-per-minute and tokens-per-minute budgets,
+    retries rate limits and transient failures with jittered exponential
+    backoff (honoring Retry-After), sheds load through a circuit breaker that
+    counts server and connection failures but not rate limits, and
+    optionally sends a hedged duplicate when a call runs past the model's p95
+    latency and there is spare rate budget. Calls name a priority lane, and
+    the rate budgets are shared between lanes by ``lane_weights``.
+
+    ``client`` must be an ``openai.AsyncOpenAI`` client, so calls wait on the
+    event loop instead of occupying threads other blocking work needs.
+    """
+
+    def __init__(
+        self,
+        client,
+        requests_per_minute: float = 500,
+        tokens_per_minute: float = 30000,
+        max_retries: int = 4,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        hedge: bool = False,
+        lane_weights: Optional[Dict[str, float]] = None,
+    ):
+        self.client = client
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.hedge = hedge
+        self.lane_weights = lane_weights or {}
+        self._models: Dict[str, _ModelState] = {}
+
+    def _state(self, model: str) -> _ModelState:
+        if model not in self._models:
+            self._models[model] = _ModelState(
+                self.requests_per_minute, self.tokens_per_minute, self.failure_threshold, self.reset_timeout,
+                self.lane_weights,
+            )
+        return self._models[model]
+
+    def backoff_delay(self, attempt: int, error: Exception) -> float:
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        # Full jitter keeps concurrent retries from synchronizing
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    async def create(self, lane: str = DEFAULT_LANE, **request):
+        """Call ``chat.completions.create`` under the governor's limits, budgeted to ``lane``."""
+        state = self._state(request["model"])
+        tokens = estimate_tokens(request)
+
+        for attempt in range(self.max_retries + 1):
+            if not state.breaker.allow():
+                state.rejected += 1
+                raise CircuitOpenError(
+                    f"Circuit open for {request['model']}, not calling the API",
+                    retry_after=state.breaker.seconds_until_trial(),
+                )
+
+            await state.requests.acquire(1, lane)
+            await state.tokens.acquire(tokens, lane)
+            state.calls += 1
+            try:
+                response = await self._call(state, tokens, request)
+            except Exception as error:
+                if not is_retryable(error):
+                    # The API answered, so this says nothing about its health
+                    state.breaker.trial_in_flight = False
+                    raise
+                if isinstance(error, openai.RateLimitError):
+                    # Being throttled means the API is up; only backoff handles this
+                    state.breaker.trial_in_flight = False
+                else:
+                    state.breaker.record_failure()
+                if attempt == self.max_retries:
+                    raise RetriesExhaustedError(
+                        f"LLM call to {request['model']} failed after {self.max_retries} retries: {str(error)}",
+                        last_error=error,
+                        retry_after=retry_after_seconds(error),
+                    ) from error
+                delay = self.backoff_delay(attempt, error)
+                state.retries += 1
+                print(f"LLM call to {request['model']} failed ({type(error).__name__}), "
+                      f"retrying in {delay:.2f} seconds (attempt {attempt + 1}/{self.max_retries})")
+                await asyncio.sleep(delay)
+                continue
+
+            state.breaker.record_success()
+            return response
+
+    async def _call(self, state: _ModelState, tokens: int, request: dict):
+        started = time.monotonic()
+        attempts = [asyncio.create_task(self.client.chat.completions.create(**request))]
+        try:
+            deadline = state.latency.p95() if self.hedge else None
+            if deadline is not None:
+                done, _ = await asyncio.wait(attempts, timeout=deadline)
+                # Only hedge with spare budget so duplicates never queue ahead of real work
+                if not done and state.requests.try_acquire(1):
+                    if state.tokens.try_acquire(tokens):
+                        state.hedges += 1
+                        attempts.append(asyncio.create_task(self.client.chat.completions.create(**request)))
+                    else:
+                        state.requests.available += 1
+
+            first_error = None
+            pending = set(attempts)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        state.latency.record(time.monotonic() - started)
+                        return task.result()
+                    first_error = first_error or task.exception()
+            raise first_error
+        finally:
+            # Drop a losing hedge, or every call if the caller gave up, so none keeps holding a connection
+            for attempt in attempts:
+                attempt.cancel()
+
+    def stats(self) -> dict:
+        return {
+            model: {
+                "circuit": state.breaker.state,
+                "calls": state.calls,
+                "retries": state.retries,
+                "hedges": state.hedges,
+                "rejected": state.rejected,
+                "waiting": state.tokens.waiting(),
+                "p95_seconds": state.latency.p95(),
+            }
+            for model, state in self._models.items()
+        }
@@ -0,0 +1,300 @@
+import asyncio
+import fcntl
+import hashlib
+import os
+import sqlite3
+import re
+import time
+import uuid
+from collections import deque
+from pathlib import Path
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+SUPPORTED_EXTENSIONS = {"pdf", "png", "jpg", "jpeg"}
+
+# Subdirectories created inside each watched directory
+PROCESSING_DIR = ".processing"
+PROCESSED_DIR = ".processed"
+FAILED_DIR = ".failed"
+
+# Held locked by the daemon that owns a claim directory for as long as it runs
+OWNER_LOCK = ".lock"
+
+# Claimed files are renamed to "<token>-<original name>" so drops that reuse a name never collide
+CLAIM_TOKEN_PATTERN = re.compile(r"^[0-9a-f]{12}-")
+
+
+def original_name(claimed: Path) -> str:
+    """The name a file was dropped under, without its claim token."""
+    return CLAIM_TOKEN_PATTERN.sub("", claimed.name, count=1)
+
+
+def move_without_overwrite(source: Path, directory: Path, name: str) -> Path:
+    """Move a file into a directory, renaming it if the name is already taken there."""
+    target = directory / name
+    if target.exists():
+        stem, dot, extension = name.rpartition(".")
+        token = uuid.uuid4().hex[:8]
+        target = directory / (f"{stem}.{token}.{extension}" if dot else f"{name}.{token}")
+    os.rename(source, target)
+    return target
+
+
+def try_lock(path: Path) -> Optional[int]:
+    """Open and exclusively lock a file, returning its descriptor, or None if another process holds the lock."""
+    try:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    except FileNotFoundError:
+        return None
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return None
+    return fd
+
+
+class IngestionDaemon:
+    """
+    Watches directories for invoice files and feeds them to the extraction pipeline.
+
+    New files are claimed by renaming them, under a unique name, into this
+    daemon's own ``.processing/<daemon id>/`` directory. The rename is atomic,
+    so several daemons can share a directory without processing a file twice,
+    and a new file dropped under a name that is still being processed does
+    not replace it. Each daemon holds a lock on its claim directory while it
+    runs; at startup it takes over only the claims of daemons whose lock is
+    free, i.e. that have exited. Claimed files go through a bounded queue to a
+    fixed pool of workers; when the queue is full the scanner stops claiming,
+    leaving the backlog in place. Finished files move to ``.processed/`` or
+    ``.failed/`` and their content digest is checkpointed, so interrupted
+    files are retried and already extracted content is not sent again.
+    Errors that ``is_transient`` accepts (e.g. the LLM being rate limited)
+    keep the file claimed and retry it after a delay instead of failing it.
+    """
+
+    def __init__(
+        self,
+        directories: List[str],
+        process: Callable[[bytes, str], Awaitable[str]],
+        checkpoint_path: str,
+        concurrency: int = 4,
+        queue_size: int = 16,
+        poll_interval: float = 2.0,
+        settle_seconds: float = 5.0,
+        is_transient: Optional[Callable[[Exception], bool]] = None,
+        max_retry_delay: float = 300.0,
+    ):
+        self.directories = [Path(d) for d in directories]
+        self.daemon_id = uuid.uuid4().hex[:12]
+        self.process = process
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        # Files modified more recently than this may still be being written
+        self.settle_seconds = settle_seconds
+        self.queue_size = queue_size
+        self.is_transient = is_transient
+        self.max_retry_delay = max_retry_delay
+        self.retries = 0
+        self.queue: Optional[asyncio.Queue] = None
+        self.processed = 0
+        self.failed = 0
+        self.skipped = 0
+        self.backlog = 0
+        self.started_at: Optional[float] = None
+        self._completions = deque()
+        self._owner_locks: List[int] = []
+        self._db = sqlite3.connect(checkpoint_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS ingested ("
+            "digest TEXT PRIMARY KEY, source TEXT NOT NULL, invoice_id TEXT NOT NULL, ingested_at REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    async def run(self):
+        self.started_at = time.time()
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        for directory in self.directories:
+            for name in (PROCESSING_DIR, PROCESSED_DIR, FAILED_DIR):
+                (directory / name).mkdir(parents=True, exist_ok=True)
+            self._claim_dir(directory).mkdir()
+            self._owner_locks.append(try_lock(self._claim_dir(directory) / OWNER_LOCK))
+        print(f"Ingestion daemon {self.daemon_id} watching: {', '.join(str(d) for d in self.directories)}")
+
+        workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        try:
+            # Files claimed by daemons that have since exited are still in their claim directories
+            for directory in self.directories:
+                for path in await asyncio.to_thread(self._recover_claims, directory):
+                    await self.queue.put((directory, path))
+            while True:
+                await self._scan()
+                await asyncio.sleep(self.poll_interval)
+        finally:
+            for worker in workers:
+                worker.cancel()
+            # Releasing the locks lets the next daemon recover whatever is left
+            for fd in self._owner_locks:
+                os.close(fd)
+            self._owner_locks = []
+
+    def _claim_dir(self, directory: Path) -> Path:
+        return directory / PROCESSING_DIR / self.daemon_id
+
+    def _recover_claims(self, directory: Path) -> List[Path]:
+        """Move files claimed by daemons that are no longer running into this daemon's claim directory."""
+        own = self._claim_dir(directory)
+        recovered = []
+        for entry in sorted((directory / PROCESSING_DIR).iterdir()):
+            if entry == own:
+                continue
+            if entry.is_file():
+                # Claimed directly into .processing/ by a daemon predating claim directories
+                stale = [entry]
+                fd = None
+            else:
+                fd = try_lock(entry / OWNER_LOCK)
+                if fd is None:
+                    # Its daemon is still running, or another daemon is recovering it
+                    continue
+                stale = sorted(path for path in entry.iterdir() if path.name != OWNER_LOCK)
+            try:
+                for path in stale:
+                    try:
+                        os.rename(path, own / path.name)
+                    except FileNotFoundError:
+                        continue
+                    recovered.append(own / path.name)
+                if fd is not None:
+                    (entry / OWNER_LOCK).unlink(missing_ok=True)
+                    entry.rmdir()
+            except OSError as e:
+                print(f"Ingestion: could not recover claims from {entry.name}: {str(e)}")
+            finally:
+                if fd is not None:
+                    os.close(fd)
+        if recovered:
+            print(f"Ingestion: recovered {len(recovered)} file(s) claimed by daemons that exited")
+        return recovered
+
+    def _list_candidates(self) -> List[Tuple[Path, str]]:
+        """Settled, supported files waiting in the watched directories."""
+        now = time.time()
+        candidates = []
+        for directory in self.directories:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    extension = entry.name.lower().rsplit(".", 1)[-1] if "." in entry.name else ""
+                    if not entry.is_file() or entry.name.startswith(".") or extension not in SUPPORTED_EXTENSIONS:
+                        continue
+                    if now - entry.stat().st_mtime < self.settle_seconds:
+                        continue
+                    candidates.append((directory, entry.name))
+        return sorted(candidates, key=lambda c: c[1])
+
+    async def _scan(self):
+        # Listing thousands of files is slow; keep it off the event loop the API also runs on
+        candidates = await asyncio.to_thread(self._list_candidates)
+        self.backlog = len(candidates)
+
+        for directory, name in candidates:
+            claimed = self._claim_dir(directory) / f"{uuid.uuid4().hex[:12]}-{name}"
+            try:
+                await asyncio.to_thread(os.rename, directory / name, claimed)
+            except FileNotFoundError:
+                # Another daemon claimed it first
+                self.backlog -= 1
+                continue
+            # Blocks while the workers are saturated
+            await self.queue.put((directory, claimed))
+            self.backlog -= 1
+
+    async def _worker(self):
+        while True:
+            directory, path = await self.queue.get()
+            try:
+                await self._ingest(directory, path)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # A worker must never exit, or the pool silently shrinks
+                print(f"Ingestion: unexpected error handling {path.name}: {str(e)}")
+            finally:
+                self.queue.task_done()
+
+    async def _ingest(self, directory: Path, path: Path):
+        name = original_name(path)
+        try:
+            file_bytes = await asyncio.to_thread(path.read_bytes)
+            digest = hashlib.sha256(file_bytes).hexdigest()
+            row = self._db.execute("SELECT invoice_id FROM ingested WHERE digest = ?", (digest,)).fetchone()
+            if row is not None:
+                self.skipped += 1
+                print(f"Ingestion: {name} already ingested as invoice {row[0]}, skipping")
+            else:
+                invoice_id = await self._process_with_retries(file_bytes, name)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO ingested (digest, source, invoice_id, ingested_at) VALUES (?, ?, ?, ?)",
+                    (digest, str(directory / name), invoice_id, time.time()),
+                )
+                self._db.commit()
+                self.processed += 1
+                self._record_completion()
+                print(f"Ingestion: {name} extracted as invoice {invoice_id}")
+        except asyncio.CancelledError:
+            # Left claimed and recovered by the next daemon to start
+            raise
+        except Exception as e:
+            self.failed += 1
+            print(f"Ingestion: failed to process {name}: {str(e)}")
+            self._archive(path, directory / FAILED_DIR, name)
+            return
+        self._archive(path, directory / PROCESSED_DIR, name)
+
+    @staticmethod
+    def _archive(path: Path, target_dir: Path, name: str):
+        try:
+            move_without_overwrite(path, target_dir, name)
+        except OSError as e:
+            # The file stays claimed and is retried once this daemon has exited
+            print(f"Ingestion: could not move {name} to {target_dir.name}: {str(e)}")
+
+    async def _process_with_retries(self, file_bytes: bytes, name: str) -> str:
+        attempt = 0
+        while True:
+            try:
+                return await self.process(file_bytes, name)
+            except Exception as e:
+                if self.is_transient is None or not self.is_transient(e):
+                    raise
+                # Holding the worker while waiting also slows claiming of new files
+                delay = min(self.max_retry_delay, max(getattr(e, "retry_after", None) or 0, self.poll_interval * 2 ** attempt))
+                attempt += 1
+                self.retries += 1
+                print(f"Ingestion: {name} hit a temporary error ({str(e)}), retrying in {delay:.0f} seconds")
+                await asyncio.sleep(delay)
+
+    def _record_completion(self):
+        now = time.time()
+        self._completions.append(now)
+        self._trim_completions(now)
+
+    def _trim_completions(self, now: float):
+        while self._completions and now - self._completions[0] > 60:
+            self._completions.popleft()
+
+    def stats(self) -> dict:
+        now = time.time()
+        self._trim_completions(now)
+        return {
+            "daemon_id": self.daemon_id,
+            "directories": [str(d) for d in self.directories],
+            "processed": self.processed,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "retries": self.retries,
+            "queued": self.queue.qsize() if self.queue else 0,
+            "backlog": self.backlog,
+            "files_per_minute": len(self._completions),
+            "uptime_seconds": round(now - self.started_at, 1) if self.started_at else 0,
+        }
@@ -1,26 +1,90 @@
+import asyncio
 import base64
 import os
 import json
+import re
+import threading
 import time
 import uuid
 from pathlib import Path
 from datetime import datetime
+from contextlib import asynccontextmanager
 from typing import Optional
-from fastapi import FastAPI, UploadFile, File, HTTPException, Form
+from fastapi import FastAPI, UploadFile, File, HTTPException, Form, BackgroundTasks, Request
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import fitz  # PyMuPDF
 
 import openai
 from dotenv import load_dotenv
-from prompts import INVOICE_PROMPT
+from prompts import INVOICE_PROMPT, KNOWN_VENDOR_PROMPT
 
 # Local import - when running from backend directory
 try:
-    from app.models import InvoiceData, InvoiceCorrection, UploadResponse
+    from app.models import InvoiceData, InvoiceCorrection, InvoiceSearchResponse, UploadResponse
 except ImportError:
     # Fallback - when running from app directory
-    from models import InvoiceData, InvoiceCorrection, UploadResponse
+    from models import InvoiceData, InvoiceCorrection, InvoiceSearchResponse, UploadResponse
+
+try:
+    from app.governor import LLMGovernor, LLMUnavailableError
+except ImportError:
+    from governor import LLMGovernor, LLMUnavailableError
+
+try:
+    from app.ingest import IngestionDaemon
+except ImportError:
+    from ingest import IngestionDaemon
+
+try:
+    from app.previews import (
+        CACHE_CONTROL, detach_previews, is_valid_digest, load_manifest, render_previews, resolve_asset
+    )
+except ImportError:
+    from previews import (
+        CACHE_CONTROL, detach_previews, is_valid_digest, load_manifest, render_previews, resolve_asset
+    )
+
+try:
+    from app.export import EXPORT_FORMATS, parquet_available, stream_export
+except ImportError:
+    from export import EXPORT_FORMATS, parquet_available, stream_export
+
+try:
+    from app.scheduler import BULK, INTERACTIVE, LaneScheduler, SharedPriority
+except ImportError:
+    from scheduler import BULK, INTERACTIVE, LaneScheduler, SharedPriority
+
+try:
+    from app.search import InvoiceIndex
+except ImportError:
+    from search import InvoiceIndex
+
+try:
+    from app.singleflight import SingleFlight
+except ImportError:
+    from singleflight import SingleFlight
+
+try:
+    from app.splitter import split_invoices
+except ImportError:
+    from splitter import split_invoices
+
+try:
+    from app.storage import UploadStore
+except ImportError:
+    from storage import UploadStore
+
+try:
+    from app.vendors import VendorProfileCache
+except ImportError:
+    from vendors import VendorProfileCache
+
+try:
+    from app.serialization import InvoiceResponseCache, choose_encoding, etag_matches, upload_response_body
+except ImportError:
+    from serialization import InvoiceResponseCache, choose_encoding, etag_matches, upload_response_body
 
 # Load environment variables
 load_dotenv()
@@ -30,17 +94,66 @@ openai_api_key = os.getenv("OPENAI_API_KEY")
 print(f"OpenAI API key loaded: {'Yes' if openai_api_key else 'No'}")
 if openai_api_key:
     print(f"API key first 5 chars: {openai_api_key[:5]}...")
-    client = openai.OpenAI(api_key=openai_api_key)
+    # Retries are handled by the governor below; OPENAI_BASE_URL can point at a local stub server
+    client = openai.AsyncOpenAI(api_key=openai_api_key, base_url=os.getenv("OPENAI_BASE_URL") or None, max_retries=0)
     print("OpenAI client initialized successfully")
 else:
     print("WARNING: No OpenAI API key found. Using mock data.")
     client = None
     print("WARNING: OPENAI_API_KEY not found. Using mock data for development.")
 
+# Upload retention settings; unset budgets disable that part of the policy
+UPLOAD_RETENTION_DAYS = float(os.getenv("UPLOAD_RETENTION_DAYS", "0")) or None
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", "0")) or None
+UPLOAD_COMPACTION_INTERVAL = float(os.getenv("UPLOAD_COMPACTION_INTERVAL", "3600"))
+
+
+async def compact_uploads_periodically():
+    """Apply the upload retention policy in the background."""
+    max_age_seconds = UPLOAD_RETENTION_DAYS * 86400 if UPLOAD_RETENTION_DAYS else None
+    while True:
+        await asyncio.sleep(UPLOAD_COMPACTION_INTERVAL)
+        try:
+            summary = await asyncio.to_thread(upload_store.compact, max_age_seconds, UPLOAD_MAX_BYTES)
+            print(f"[{get_timestamp()}] Upload compaction removed {summary['removed']} file(s), "
+                  f"freed {summary['freed_bytes']} bytes")
+        except Exception as e:
+            print(f"[{get_timestamp()}] Upload compaction failed: {str(e)}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    background = [asyncio.create_task(compact_uploads_periodically())]
+    if ingestion_daemon is not None:
+        background.append(asyncio.create_task(ingestion_daemon.run()))
+    yield
+    for task in background:
+        task.cancel()
+
+
+# Priority lanes: interactive uploads get most of the extraction, rasterization and
+# LLM rate limit capacity while bulk work (backfills, folder ingestion) is capped below the total
+LANES = {
+    INTERACTIVE: (4.0, None),
+    BULK: (1.0, int(os.getenv("BULK_MAX_CONCURRENCY", "6")) or None),
+}
+LANE_WEIGHTS = {lane: weight for lane, (weight, _) in LANES.items()}
+
+# Rate limits, retries and circuit breaking for all LLM calls
+llm_governor = LLMGovernor(
+    client,
+    requests_per_minute=float(os.getenv("LLM_REQUESTS_PER_MINUTE", "500")),
+    tokens_per_minute=float(os.getenv("LLM_TOKENS_PER_MINUTE", "30000")),
+    max_retries=int(os.getenv("LLM_MAX_RETRIES", "4")),
+    hedge=os.getenv("LLM_HEDGE_REQUESTS", "false").lower() == "true",
+    lane_weights=LANE_WEIGHTS
+)
+
 app = FastAPI(
     title="Invoice Parser API",
     description="AI-powered invoice parsing service",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
 # Create a directory for PDF previews
@@ -50,6 +163,10 @@ PREVIEWS_DIR.mkdir(exist_ok=True)
 # Mount the previews directory
 app.mount("/previews", StaticFiles(directory="previews"), name="previews")
 
+# Previews currently being rendered, by content digest
+previews_in_progress = set()
+previews_lock = threading.Lock()
+
 # Configure CORS - use a more permissive configuration for development
 app.add_middleware(
     CORSMiddleware,
@@ -67,11 +184,52 @@ os.makedirs(uploads_dir, exist_ok=True)
 # Mount the uploads directory to serve static files
 app.mount("/uploads", StaticFiles(directory=uploads_dir), name="uploads")
 
+# Uploads are stored by content hash; the index lives outside the served directory
+# Previews are removed together with the file they were rendered from
+upload_store = UploadStore(
+    uploads_dir,
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "uploads_index.sqlite3"),
+    on_detach=lambda digest: detach_previews(PREVIEWS_DIR, digest),
+)
+
 # In-memory storage for processed invoices and corrections
 # In a real app, this would be a database
 processed_invoices = {}
 correction_logs = []
 
+# Serialized invoice bodies, reused until the invoice is corrected
+invoice_responses = InvoiceResponseCache(int(os.getenv("INVOICE_RESPONSE_CACHE_SIZE", "1024")))
+
+# Stable vendor and customer details for known vendors
+vendor_profiles = VendorProfileCache(os.path.join(os.path.dirname(os.path.dirname(__file__)), "vendor_profiles.sqlite3"))
+
+# Concurrent uploads of the same content share one extraction
+extraction_flights = SingleFlight()
+
+extraction_lanes = LaneScheduler("extraction", int(os.getenv("EXTRACTION_CONCURRENCY", "8")), LANES)
+# At least two slots, so a capped bulk lane always leaves one for interactive uploads
+raster_lanes = LaneScheduler(
+    "rasterization", int(os.getenv("RASTER_CONCURRENCY", str(max(2, os.cpu_count() or 2)))), LANES
+)
+# Full-document preview rendering is slow, so it gets its own slots rather than
+# holding the ones extraction needs to rasterize first pages
+preview_lanes = LaneScheduler("previews", int(os.getenv("PREVIEW_CONCURRENCY", "2")), LANES)
+
+# Bulk ingestion from watched directories, enabled by INGEST_DIRS (comma separated)
+INGEST_DIRS = [d.strip() for d in os.getenv("INGEST_DIRS", "").split(",") if d.strip()]
+ingestion_daemon = IngestionDaemon(
+    INGEST_DIRS,
+    lambda file_bytes, filename: ingest_file(file_bytes, filename),
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "ingest_checkpoint.sqlite3"),
+    concurrency=int(os.getenv("INGEST_CONCURRENCY", "4")),
+    queue_size=int(os.getenv("INGEST_QUEUE_SIZE", "16")),
+    poll_interval=float(os.getenv("INGEST_POLL_INTERVAL", "2")),
+    is_transient=lambda error: isinstance(error, LLMUnavailableError)
+) if INGEST_DIRS else None
+
+# Durable, searchable copy of every processed invoice
+invoice_index = InvoiceIndex(os.path.join(os.path.dirname(os.path.dirname(__file__)), "invoices_index.sqlite3"))
+
 # Mock data for development when API key is not available
 MOCK_INVOICE_DATA = {
     "invoice_number": "INV-2025-0412",
@@ -171,8 +329,51 @@ def get_timestamp():
     """Get current timestamp in a readable format"""
     return datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
 
-async def process_invoice_with_ai(file_bytes: bytes, filename: str, file_path: str) -> dict:
-    """Process an invoice with AI to extract structured data."""
+
+async def store_invoice(invoice_id: str, invoice_data):
+    """Store a processed or corrected invoice and keep the search index and response cache in sync."""
+    processed_invoices[invoice_id] = invoice_data
+    invoice_responses.invalidate(invoice_id)
+    try:
+        # Each upsert is a SQLite commit; keep it off the event loop
+        await asyncio.to_thread(invoice_index.upsert, invoice_id, InvoiceData.model_validate(invoice_data))
+    except Exception as e:
+        print(f"[{get_timestamp()}] Failed to index invoice {invoice_id}: {str(e)}")
+
+
+async def load_invoice(invoice_id: str):
+    """Look up an invoice in memory, falling back to the search index."""
+    if invoice_id in processed_invoices:
+        return processed_invoices[invoice_id]
+    return await asyncio.to_thread(invoice_index.get, invoice_id)
+
+async def process_invoice_with_ai(
+    file_bytes: bytes, filename: str, file_path: str, page_image: Optional[bytes] = None, lane: str = INTERACTIVE
+) -> dict:
+    """
+    Process an invoice with AI to extract structured data.
+
+    For PDFs, ``page_image`` may carry an already rasterized first page so the
+    document is not rendered twice. LLM calls are budgeted to the priority
+    ``lane``. Raises ``LLMUnavailableError`` when the API is rate limiting or
+    down, instead of falling back to mock data.
+    """
+    result = await run_invoice_extraction(file_bytes, filename, file_path, page_image, lane, use_vendor_profile=True)
+    if result.get("vendor_mismatch"):
+        # The short prompt left out vendor and customer details, so extract everything again
+        print(f"[{get_timestamp()}] Vendor check failed for {filename}, extracting again with the full prompt")
+        result = await run_invoice_extraction(file_bytes, filename, file_path, page_image, lane, use_vendor_profile=False)
+    return result
+
+
+async def run_invoice_extraction(
+    file_bytes: bytes, filename: str, file_path: str, page_image: Optional[bytes], lane: str, use_vendor_profile: bool
+) -> dict:
+    """
+    Run one extraction pass. With ``use_vendor_profile``, a known vendor gets
+    the shorter prompt and the result is ``{"vendor_mismatch": True}`` if the
+    document does not match the cached profile.
+    """
     # Track processing time
     processing_start_time = time.time()
     print(f"[{get_timestamp()}] Starting processing for file: {filename}")
@@ -182,13 +383,25 @@ async def process_invoice_with_ai(file_bytes: bytes, filename: str, file_path: s
     if not client:
         # Return mock data if no API key is available
         invoice_id = str(uuid.uuid4())
-        processed_invoices[invoice_id] = MOCK_INVOICE_DATA
+        await store_invoice(invoice_id, MOCK_INVOICE_DATA)
         # Add file path to the response
         return {"success": True, "data": MOCK_INVOICE_DATA, "invoice_id": invoice_id, "file_path": str(file_path)}
 
     try:
         print(f"[{get_timestamp()}] Processing file: {filename}, type: {file_extension}")
 
+        # Known vendors get a shorter prompt; their stable fields come from the profile cache
+        prompt = INVOICE_PROMPT
+        vendor_profile = None
+        if file_extension == "pdf" and use_vendor_profile:
+            try:
+                vendor_profile = vendor_profiles.identify(extract_text_from_file(file_bytes, file_extension))
+            except Exception as identify_err:
+                print(f"Vendor identification failed: {str(identify_err)}")
+            if vendor_profile is not None:
+                prompt = KNOWN_VENDOR_PROMPT
+                print(f"[{get_timestamp()}] Known vendor {vendor_profile['vendor'].get('name')}, requesting variable fields only")
+
         # Process based on file type
         try:
             # For PDFs, convert to image for vision API
@@ -198,7 +411,7 @@ async def process_invoice_with_ai(file_bytes: bytes, filename: str, file_path: s
                     # Convert PDF to image
                     pdf_convert_start = time.time()
                     print(f"[{get_timestamp()}] Starting PDF to image conversion")
-                    image_bytes = convert_pdf_to_image(file_bytes)
+                    image_bytes = page_image if page_image is not None else convert_pdf_to_image(file_bytes)
                     pdf_convert_end = time.time()
                     print(f"[{get_timestamp()}] PDF successfully converted to image in {pdf_convert_end - pdf_convert_start:.2f} seconds")
 
@@ -219,11 +432,12 @@ async def process_invoice_with_ai(file_bytes: bytes, filename: str, file_path: s
                     # Use text-based approach
                     try:
                         print("Using text-based API for PDF processing")
-                        full_prompt = f"{INVOICE_PROMPT}\n\nINVOICE CONTENT:\n{text_content}"
+                        full_prompt = f"{prompt}\n\nINVOICE CONTENT:\n{text_content}"
 
                         # Call OpenAI API
                         print("Calling OpenAI API...")
-                        response = client.chat.completions.create(
+                        response = await llm_governor.create(
+                            lane=lane,
                             model="gpt-4",  # or another appropriate model
                             messages=[
                                 {"role": "system", "content": "You are an expert invoice data extraction assistant."},
@@ -235,10 +449,12 @@ async def process_invoice_with_ai(file_bytes: bytes, filename: str, file_path: s
                         print("OpenAI API call completed successfully")
                     except Exception as text_api_err:
                         print(f"Error in text API processing: {str(text_api_err)}")
+                        if isinstance(text_api_err, LLMUnavailableError):
+                            raise
                         # Fallback to mock data if API fails
                         print("Falling back to mock data due to API error")
                         invoice_id = str(uuid.uuid4())
-                        processed_invoices[invoice_id] = MOCK_INVOICE_DATA
+                        await store_invoice(invoice_id, MOCK_INVOICE_DATA)
                         return {"success": True, "data": MOCK_INVOICE_DATA, "invoice_id": invoice_id, "file_path": str(file_path)}
 
                     # Skip the vision API processing
@@ -273,7 +489,8 @@ async def process_invoice_with_ai(file_bytes: bytes, filename: str, file_path: s
                     timeout_seconds = 60  # 1 minute timeout
                     
                     # Create a future for the API call
-                    response = client.chat.completions.create(
+                    response = await llm_governor.create(
+                        lane=lane,
                         model="gpt-4-turbo",
                         messages=[
                             {
@@ -283,7 +500,7 @@ async def process_invoice_with_ai(file_bytes: bytes, filename: str, file_path: s
                             {
                                 "role": "user",
                                 "content": [
-                                    {"type": "text", "text": INVOICE_PROMPT},
+                                    {"type": "text", "text": prompt},
                                     {
                                         "type": "image_url",
                                         "image_url": {
@@ -305,11 +522,12 @@ async def process_invoice_with_ai(file_bytes: bytes, filename: str, file_path: s
                     if file_extension == "pdf" and text_content:
                         print("Falling back to text-based processing for PDF")
                         try:
-                            full_prompt = f"{INVOICE_PROMPT}\n\nINVOICE CONTENT:\n{text_content}"
+                            full_prompt = f"{prompt}\n\nINVOICE CONTENT:\n{text_content}"
 
                             # Call OpenAI API
                             print("Calling OpenAI API with text...")
-                            response = client.chat.completions.create(
+                            response = await llm_governor.create(
+                                lane=lane,
                                 model="gpt-4",
                                 messages=[
                                     {"role": "system", "content": "You are an expert invoice data extraction assistant."},
@@ -321,23 +539,29 @@ async def process_invoice_with_ai(file_bytes: bytes, filename: str, file_path: s
                             print("OpenAI text API call completed successfully")
                         except Exception as text_fallback_err:
                             print(f"Text fallback also failed: {str(text_fallback_err)}")
+                            if isinstance(text_fallback_err, LLMUnavailableError):
+                                raise
                             # Use mock data as last resor
                             print("Falling back to mock data as last resort")
                             invoice_id = str(uuid.uuid4())
-                            processed_invoices[invoice_id] = MOCK_INVOICE_DATA
+                            await store_invoice(invoice_id, MOCK_INVOICE_DATA)
                             return {"success": True, "data": MOCK_INVOICE_DATA, "invoice_id": invoice_id, "file_path": str(file_path)}
                     else:
+                        if isinstance(api_err, LLMUnavailableError):
+                            raise
                         # No text fallback available, use mock data
                         print("Falling back to mock data due to API error")
                         invoice_id = str(uuid.uuid4())
-                        processed_invoices[invoice_id] = MOCK_INVOICE_DATA
+                        await store_invoice(invoice_id, MOCK_INVOICE_DATA)
                         return {"success": True, "data": MOCK_INVOICE_DATA, "invoice_id": invoice_id, "file_path": str(file_path)}
+        except LLMUnavailableError:
+            raise
         except Exception as process_err:
             print(f"Error in file processing: {str(process_err)}")
             # Fallback to mock data if processing fails
             print("Falling back to mock data due to processing error")
             invoice_id = str(uuid.uuid4())
-            processed_invoices[invoice_id] = MOCK_INVOICE_DATA
+            await store_invoice(invoice_id, MOCK_INVOICE_DATA)
             return {"success": True, "data": MOCK_INVOICE_DATA, "invoice_id": invoice_id, "file_path": str(file_path)}
 
         try:
@@ -361,6 +585,10 @@ async def process_invoice_with_ai(file_bytes: bytes, filename: str, file_path: s
                     print("Treating entire response as JSON")
                     invoice_data = json.loads(response_text)
 
+                # Fill vendor and customer from the cached profile if the document agrees with it
+                if vendor_profile is not None and not vendor_profiles.apply(invoice_data, vendor_profile):
+                    return {"success": False, "vendor_mismatch": True}
+
                 # Validate with Pydantic model
                 print("Validating with Pydantic model")
                 
@@ -436,10 +664,12 @@ async def process_invoice_with_ai(file_bytes: bytes, filename: str, file_path: s
                         print(f"Discrepancy detected: Invoice total {invoice_total} doesn't match calculated total {line_item_sum}")
                 
                 validated_data = InvoiceData(**invoice_data)
+                if vendor_profile is None:
+                    vendor_profiles.learn(validated_data)
                 
                 # Store in memory
                 invoice_id = str(uuid.uuid4())
-                processed_invoices[invoice_id] = validated_data
+                await store_invoice(invoice_id, validated_data)
                 
                 # Calculate and log total processing time
                 processing_end_time = time.time()
@@ -456,7 +686,7 @@ async def process_invoice_with_ai(file_bytes: bytes, filename: str, file_path: s
                 print(f"Error parsing JSON: {str(json_err)}")
                 print("Falling back to mock data due to JSON parsing error")
                 invoice_id = str(uuid.uuid4())
-                processed_invoices[invoice_id] = MOCK_INVOICE_DATA
+                await store_invoice(invoice_id, MOCK_INVOICE_DATA)
                 return {
                     "success": True,
                     "data": MOCK_INVOICE_DATA,
@@ -468,28 +698,175 @@ async def process_invoice_with_ai(file_bytes: bytes, filename: str, file_path: s
                 # Fallback to mock data if validation fails
                 print("Falling back to mock data due to validation error")
                 invoice_id = str(uuid.uuid4())
-                processed_invoices[invoice_id] = MOCK_INVOICE_DATA
+                await store_invoice(invoice_id, MOCK_INVOICE_DATA)
                 return {"success": True, "data": MOCK_INVOICE_DATA, "invoice_id": invoice_id, "file_path": str(file_path)}
         except Exception as parse_err:
             print(f"Error parsing response: {str(parse_err)}")
             return {"success": False, "error": f"Error processing invoice data: {str(parse_err)}"}
 
+    except LLMUnavailableError:
+        raise
     except Exception as e:
         print(f"Unhandled exception in process_invoice_with_ai: {str(e)}")
         # Fallback to mock data for any unhandled exceptions
         invoice_id = str(uuid.uuid4())
-        processed_invoices[invoice_id] = MOCK_INVOICE_DATA
+        await store_invoice(invoice_id, MOCK_INVOICE_DATA)
         return {"success": True, "data": MOCK_INVOICE_DATA, "invoice_id": invoice_id, "file_path": str(file_path)}
 
 
+async def extract_stored_file(stored, file_bytes: bytes, filename: str, file_extension: str, lane: str):
+    """
+    Extract invoice data from a file already saved in the upload store,
+    scheduled in the given priority lane.
+    An interactive upload of a file the bulk lane is already extracting raises
+    that extraction to the interactive lane rather than waiting behind it.
+    Returns the processing result and the rasterized first page (PDFs only).
+    """
+    # Create a proper URL for the file that can be accessed from the frontend
+    file_url = f"/uploads/{stored.relative_path}"
+
+    priority = SharedPriority(lane, LANE_WEIGHTS)
+
+    async def extract():
+        # Rasterize the first PDF page once, shared by extraction and previews
+        page_image = None
+        if file_extension == "pdf":
+            try:
+                async with raster_lanes.slot(priority):
+                    page_image = await asyncio.to_thread(convert_pdf_to_image, file_bytes)
+            except Exception as convert_err:
+                print(f"[{get_timestamp()}] Could not rasterize PDF up front: {str(convert_err)}")
+        async with extraction_lanes.slot(priority):
+            # LLM calls are budgeted to the lane the flight holds once it has a slot
+            result = await process_invoice_with_ai(
+                file_bytes, filename, file_url, page_image=page_image, lane=priority.lane
+            )
+        return result, page_image
+
+    # Identical files already being extracted (e.g. a client retry) wait for that result instead
+    result, page_image = await extraction_flights.run(stored.digest, extract, priority)
+    return dict(result), page_image
+
+
+async def store_and_extract(file_bytes: bytes, filename: str, file_extension: str, lane: str):
+    """
+    Save a file to the upload store and extract it, releasing the file if extraction fails.
+    Returns the stored file, the processing result and the rasterized first page.
+    """
+    stored = await asyncio.to_thread(upload_store.put, file_bytes, file_extension)
+    try:
+        result, page_image = await extract_stored_file(stored, file_bytes, filename, file_extension, lane)
+        if not result["success"]:
+            raise RuntimeError(result.get("error", "Unknown error"))
+    except Exception:
+        await asyncio.to_thread(upload_store.abandon, stored.digest)
+        raise
+
+    await asyncio.to_thread(upload_store.commit, stored.digest, result["invoice_id"])
+    return stored, result, page_image
+
+
+async def extract_split_pdf(file_bytes: bytes, filename: str, segments, lane: str):
+    """
+    Extract each invoice of a split multi-invoice PDF in parallel.
+    Every part becomes its own invoice, linked back to the source file and its page range.
+    Returns the extracted parts and the page ranges that failed; raises only if all of them fail.
+    """
+    # Pinned while the parts are extracted; only kept if at least one of them succeeds
+    source = await asyncio.to_thread(upload_store.put, file_bytes, "pdf")
+    stem = filename.rsplit('.', 1)[0]
+    print(f"[{get_timestamp()}] Split {filename} into {len(segments)} invoices")
+
+    async def extract_segment(first_page, last_page, segment_bytes):
+        segment_name = f"{stem}-pages-{first_page + 1}-{last_page + 1}.pdf"
+        stored, result, page_image = await store_and_extract(segment_bytes, segment_name, "pdf", lane)
+        await asyncio.to_thread(invoice_index.link_source, result["invoice_id"], source.digest, first_page + 1, last_page + 1)
+        return {
+            "stored": stored,
+            "result": result,
+            "page_image": page_image,
+            "file_bytes": segment_bytes,
+            "document": {
+                "invoice_id": result["invoice_id"],
+                "first_page": first_page + 1,
+                "last_page": last_page + 1,
+                "file_path": result["file_path"],
+                "preview_id": stored.digest,
+                "source_id": source.digest,
+                "source_file_path": f"/uploads/{source.relative_path}",
+            },
+        }
+
+    try:
+        outcomes = await asyncio.gather(*(extract_segment(*segment) for segment in segments), return_exceptions=True)
+    except BaseException:
+        await asyncio.to_thread(upload_store.abandon, source.digest)
+        raise
+    parts = []
+    failed = []
+    for (first_page, last_page, _), outcome in zip(segments, outcomes):
+        if isinstance(outcome, Exception):
+            print(f"[{get_timestamp()}] Failed to process pages {first_page + 1}-{last_page + 1} of {filename}: {str(outcome)}")
+            failed.append({"first_page": first_page + 1, "last_page": last_page + 1, "error": str(outcome)})
+        else:
+            parts.append(outcome)
+    if not parts:
+        await asyncio.to_thread(upload_store.abandon, source.digest)
+        # Report an unavailable LLM as such, so the caller can retry later
+        raise next((o for o in outcomes if isinstance(o, LLMUnavailableError)), outcomes[0])
+
+    # The source is kept for as long as the store holds it, independent of its parts
+    await asyncio.to_thread(upload_store.commit, source.digest, f"source:{source.digest}")
+    return parts, failed
+
+
+async def ingest_file(file_bytes: bytes, filename: str) -> str:
+    """
+    Store and extract a file picked up by the ingestion daemon.
+    Returns the new invoice id (comma separated if the file held several invoices).
+    """
+    file_extension = filename.lower().split('.')[-1] if '.' in filename else ''
+    segments = await asyncio.to_thread(split_invoices, file_bytes) if file_extension == "pdf" else None
+    if segments:
+        parts, failed = await extract_split_pdf(file_bytes, filename, segments, BULK)
+        if failed:
+            # Extracted parts are kept; the file is archived as processed with the gaps logged
+            pages = ", ".join(f"{f['first_page']}-{f['last_page']}" for f in failed)
+            print(f"[{get_timestamp()}] Ingestion: pages {pages} of {filename} could not be processed")
+        for part in parts:
+            await render_previews_in_lane(part["stored"].digest, part["file_bytes"], "pdf", part["page_image"], BULK)
+        return ", ".join(part["result"]["invoice_id"] for part in parts)
+
+    stored, result, page_image = await store_and_extract(file_bytes, filename, file_extension, BULK)
+    await render_previews_in_lane(stored.digest, file_bytes, file_extension, page_image, BULK)
+    return result["invoice_id"]
+
+
+def llm_unavailable_response(error: LLMUnavailableError) -> JSONResponse:
+    """Report a rate limited or unavailable LLM as a failed upload the client can retry later."""
+    print(f"[{get_timestamp()}] LLM unavailable, rejecting upload: {str(error)}")
+    headers = {"Retry-After": str(max(1, round(error.retry_after)))} if error.retry_after else None
+    return JSONResponse(
+        status_code=error.status_code,
+        content={"success": False, "error": f"Invoice extraction is temporarily unavailable: {str(error)}"},
+        headers=headers,
+    )
+
+
 @app.post("/api/upload", response_model=UploadResponse)
-async def upload_invoice(file: UploadFile = File(...)):
+async def upload_invoice(
+    background_tasks: BackgroundTasks, file: UploadFile = File(...), priority: str = INTERACTIVE
+):
     """
     Upload and process an invoice file (PDF or image).
     Returns structured data extracted from the invoice.
+    Backfill jobs should pass priority=bulk so they don't delay interactive uploads.
     """
     try:
-        print(f"[{get_timestamp()}] Upload request received for file: {file.filename}")
+        print(f"[{get_timestamp()}] Upload request received for file: {file.filename} (priority: {priority})")
+
+        if priority not in LANES:
+            raise HTTPException(status_code=400, detail=f"Unknown priority. Use one of: {', '.join(LANES)}")
 
         file_extension = file.filename.lower().split('.')[-1] if '.' in file.filename else ''
         print(f"[{get_timestamp()}] File extension detected: {file_extension}")
@@ -498,71 +875,249 @@ async def upload_invoice(file: UploadFile = File(...)):
             print(f"[{get_timestamp()}] Invalid file type: {file_extension}")
             raise HTTPException(status_code=400, detail="Only PDF and image files (PNG, JPG, JPEG) are supported")
 
-        # Generate a unique filename
-        unique_filename = f"{uuid.uuid4()}.{file_extension}"
-        file_path = os.path.join(uploads_dir, unique_filename)
-        print(f"[{get_timestamp()}] Generated unique filename: {unique_filename}")
-
-        # Save the file
-        print(f"[{get_timestamp()}] Saving file to: {file_path}")
         file_bytes = await file.read()
-        with open(file_path, "wb") as buffer:
-            buffer.write(file_bytes)
-        print(f"[{get_timestamp()}] File saved successfully. Size: {len(file_bytes)} bytes")
+
+        # A PDF holding several invoices is split and each invoice is processed on its own
+        segments = await asyncio.to_thread(split_invoices, file_bytes) if file_extension == "pdf" else None
+        if segments:
+            try:
+                parts, failed = await extract_split_pdf(file_bytes, file.filename, segments, priority)
+            except LLMUnavailableError as unavailable:
+                return llm_unavailable_response(unavailable)
+            except Exception as process_error:
+                print(f"[{get_timestamp()}] ERROR in AI processing: {str(process_error)}")
+                raise HTTPException(status_code=500, detail=f"Failed to process invoice: {str(process_error)}")
+
+            for part in parts:
+                background_tasks.add_task(
+                    render_previews_in_lane, part["stored"].digest, part["file_bytes"], "pdf", part["page_image"], priority
+                )
+            # The first invoice is returned in full; the rest are listed in documents
+            result = dict(parts[0]["result"])
+            result["preview_id"] = parts[0]["stored"].digest
+            result["documents"] = [part["document"] for part in parts]
+            if failed:
+                pages = ", ".join(f"{f['first_page']}-{f['last_page']}" for f in failed)
+                result["error"] = (
+                    f"{len(failed)} of {len(segments)} invoices in this file could not be processed (pages {pages})"
+                )
+                result["failed_documents"] = failed
+            serialized = invoice_responses.get(result["invoice_id"], result["data"])
+            print(f"[{get_timestamp()}] Successfully processed {len(parts)} invoices. Returning result.")
+            return Response(content=upload_response_body(result, serialized.body), media_type="application/json")
+
+        # Save the file into the content-addressed store; identical uploads are stored once
+        stored = await asyncio.to_thread(upload_store.put, file_bytes, file_extension)
+        print(f"[{get_timestamp()}] File stored as {stored.relative_path} "
+              f"({'new' if stored.created else 'deduplicated'}). Size: {stored.size} bytes")
 
         # Process with AI
         try:
             print(f"[{get_timestamp()}] Starting AI processing")
-            # Create a proper URL for the file that can be accessed from the frontend
-            file_url = f"/uploads/{unique_filename}"
-            result = await process_invoice_with_ai(file_bytes, file.filename, file_url)
+            result, page_image = await extract_stored_file(stored, file_bytes, file.filename, file_extension, priority)
             print(f"[{get_timestamp()}] AI processing completed with result: {result['success']}")
 
+        except LLMUnavailableError as unavailable:
+            await asyncio.to_thread(upload_store.abandon, stored.digest)
+            return llm_unavailable_response(unavailable)
         except Exception as process_error:
             print(f"[{get_timestamp()}] ERROR in AI processing: {str(process_error)}")
-            # Clean up the file if processing failed
-            if file_path.exists():
-                try:
-                    file_path.unlink()
-                    print(f"[{get_timestamp()}] Cleaned up file after processing error")
-                except Exception as cleanup_error:
-                    print(f"[{get_timestamp()}] Failed to clean up file: {str(cleanup_error)}")
-                raise HTTPException(status_code=500, detail=f"Failed to process invoice: {str(process_error)}")
+            # Release the file if processing failed; it is only deleted when no other invoice uses it
+            if await asyncio.to_thread(upload_store.abandon, stored.digest):
+                print(f"[{get_timestamp()}] Cleaned up file after processing error")
+            raise HTTPException(status_code=500, detail=f"Failed to process invoice: {str(process_error)}")
 
         if not result["success"]:
-            # Clean up the file if processing failed
             print(f"[{get_timestamp()}] Processing unsuccessful: {result.get('error', 'Unknown error')}")
-            if file_path.exists():
-                try:
-                    file_path.unlink()
-                    print(f"[{get_timestamp()}] Cleaned up file after unsuccessful processing")
-                except Exception as cleanup_error:
-                    print(f"[{get_timestamp()}] Failed to clean up file: {str(cleanup_error)}")
-                raise HTTPException(status_code=500, detail=result["error"])
+            if await asyncio.to_thread(upload_store.abandon, stored.digest):
+                print(f"[{get_timestamp()}] Cleaned up file after unsuccessful processing")
+            raise HTTPException(status_code=500, detail=result["error"])
+
+        await asyncio.to_thread(upload_store.commit, stored.digest, result["invoice_id"])
+
+        # Render previews after the response is sent; they share the upload's content digest
+        background_tasks.add_task(
+            render_previews_in_lane, stored.digest, file_bytes, file_extension, page_image, priority
+        )
+        result["preview_id"] = stored.digest
+
+        # Serialize the invoice once; later reads of this invoice reuse the same bytes
+        serialized = invoice_responses.get(result["invoice_id"], result["data"])
 
         print(f"[{get_timestamp()}] Successfully processed invoice. Returning result.")
-        return result
+        return Response(content=upload_response_body(result, serialized.body), media_type="application/json")
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"[{get_timestamp()}] UNHANDLED EXCEPTION in upload_invoice: {str(e)}")
-        if 'file_path' in locals() and file_path.exists():
-            try:
-                file_path.unlink()
-                print(f"[{get_timestamp()}] Cleaned up file after unhandled exception")
-            except Exception as cleanup_error:
-                print(f"[{get_timestamp()}] Failed to clean up file: {str(cleanup_error)}")
+        if 'stored' in locals() and await asyncio.to_thread(upload_store.abandon, stored.digest):
+            print(f"[{get_timestamp()}] Cleaned up file after unhandled exception")
         raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
 
 
+async def render_previews_in_lane(
+    preview_id: str, file_bytes: bytes, file_extension: str, page_image: Optional[bytes], lane: str
+):
+    """Render previews in a worker thread, sharing preview rendering capacity by priority lane."""
+    async with preview_lanes.slot(lane):
+        await asyncio.to_thread(generate_previews, preview_id, file_bytes, file_extension, page_image)
+
+
+def generate_previews(preview_id: str, file_bytes: bytes, file_extension: str, page_image: Optional[bytes]):
+    """Render page thumbnails and zoom tiles into the previews directory."""
+    # Coalesced uploads of the same file all schedule this; render it once
+    with previews_lock:
+        if preview_id in previews_in_progress:
+            return
+        previews_in_progress.add(preview_id)
+    try:
+        preview_start = time.time()
+        manifest = render_previews(PREVIEWS_DIR, preview_id, file_bytes, file_extension, page_image)
+        print(f"[{get_timestamp()}] Rendered {manifest['page_count']} preview page(s) in {time.time() - preview_start:.2f} seconds")
+    except Exception as e:
+        print(f"[{get_timestamp()}] Failed to render previews: {str(e)}")
+    finally:
+        with previews_lock:
+            previews_in_progress.discard(preview_id)
+
+
+@app.get("/api/previews/{preview_id}")
+async def get_preview_manifest(preview_id: str):
+    """
+    Describe the thumbnails and zoom tiles available for an uploaded file.
+    """
+    manifest = load_manifest(PREVIEWS_DIR, preview_id) if is_valid_digest(preview_id) else None
+    if manifest is None:
+        raise HTTPException(status_code=404, detail="Preview not found")
+
+    return manifest
+
+
+@app.get("/api/previews/{preview_id}/{asset:path}")
+async def get_preview_asset(preview_id: str, asset: str, request: Request):
+    """
+    Serve a thumbnail or tile. Responses support Range requests and, since
+    previews are content-addressed, can be cached indefinitely.
+    """
+    path = resolve_asset(PREVIEWS_DIR, preview_id, asset) if is_valid_digest(preview_id) else None
+    if path is None:
+        raise HTTPException(status_code=404, detail="Preview not found")
+
+    etag = f'"{preview_id[:16]}-{asset}"'
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), [etag]):
+        return Response(status_code=304, headers=headers)
+
+    return FileResponse(path, media_type="image/png", headers=headers)
+
+
 @app.get("/api/invoice/{invoice_id}", response_model=InvoiceData)
-async def get_invoice(invoice_id: str):
+async def get_invoice(invoice_id: str, request: Request):
     """
     Retrieve a previously processed invoice by ID.
+    Serves cached JSON with an ETag, so polling clients get 304 responses
+    until the invoice is corrected.
     """
-    if invoice_id not in processed_invoices:
+    invoice = await load_invoice(invoice_id)
+    if invoice is None:
         raise HTTPException(status_code=404, detail="Invoice not found")
 
-    return processed_invoices[invoice_id]
+    serialized = invoice_responses.get(invoice_id, invoice)
+    encoding = choose_encoding(request.headers.get("accept-encoding"), len(serialized.body))
+    # Each content coding is a different representation and gets its own ETag
+    headers = {"ETag": serialized.etag_for(encoding), "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if etag_matches(request.headers.get("if-none-match"), serialized.etags):
+        return Response(status_code=304, headers=headers)
+
+    if encoding is None:
+        return Response(content=serialized.body, media_type="application/json", headers=headers)
+
+    headers["Content-Encoding"] = encoding
+    return Response(content=serialized.encoded(encoding), media_type="application/json", headers=headers)
+
+
+# Invoice dates are compared as strings, so filters must be zero-padded like the stored dates
+DATE_FILTER_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+def validate_date_filters(*values: Optional[str]):
+    """Reject date filters that are not valid YYYY-MM-DD dates."""
+    for value in values:
+        if value:
+            try:
+                if not DATE_FILTER_PATTERN.match(value):
+                    raise ValueError(value)
+                datetime.strptime(value, "%Y-%m-%d")
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Invalid date {value!r}, expected YYYY-MM-DD")
+
+
+@app.get("/api/invoices", response_model=InvoiceSearchResponse)
+async def search_invoices(
+    vendor: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    min_total: Optional[float] = None,
+    max_total: Optional[float] = None,
+    currency: Optional[str] = None,
+    discrepancy_detected: Optional[bool] = None,
+    confidence_warning: Optional[bool] = None,
+    q: Optional[str] = None,
+    source_id: Optional[str] = None,
+    limit: int = 50,
+    cursor: Optional[int] = None
+):
+    """
+    Search processed invoices, newest first.
+    Pass the returned next_cursor back as cursor to fetch the following page.
+    """
+    validate_date_filters(start_date, end_date)
+    items, next_cursor = await asyncio.to_thread(
+        invoice_index.search,
+        vendor=vendor,
+        start_date=start_date,
+        end_date=end_date,
+        min_total=min_total,
+        max_total=max_total,
+        currency=currency,
+        discrepancy_detected=discrepancy_detected,
+        confidence_warning=confidence_warning,
+        text=q,
+        source_id=source_id,
+        limit=limit,
+        cursor=cursor
+    )
+    return {"items": items, "next_cursor": next_cursor}
+
+
+@app.get("/api/export")
+async def export_invoices(
+    format: str = "csv",
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    vendor: Optional[str] = None
+):
+    """
+    Stream all processed invoices matching the filters as CSV, JSONL or Parquet.
+    CSV and Parquet have one row per line item; JSONL has one invoice per line.
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format. Use one of: {', '.join(EXPORT_FORMATS)}")
+    if format == "parquet" and not parquet_available():
+        raise HTTPException(status_code=400, detail="Parquet export requires pyarrow to be installed")
+    validate_date_filters(start_date, end_date)
+
+    print(f"[{get_timestamp()}] Exporting invoices as {format} "
+          f"(start_date={start_date}, end_date={end_date}, vendor={vendor})")
+    # Read from the index, which holds every invoice across restarts; vendor matches by prefix as in search
+    selected = invoice_index.iter_invoices(vendor=vendor, start_date=start_date, end_date=end_date)
+    filename = f"invoices-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{format}"
+    return StreamingResponse(
+        stream_export(format, selected),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
 
 @app.post("/api/corrections", response_model=InvoiceCorrection)
@@ -576,7 +1131,8 @@ async def log_correction(
     Log corrections made to an invoice.
     This helps improve the AI model over time.
     """
-    if invoice_id not in processed_invoices:
+    original_invoice = await load_invoice(invoice_id)
+    if original_invoice is None:
         raise HTTPException(status_code=404, detail="Invoice not found")
 
     try:
@@ -587,7 +1143,7 @@ async def log_correction(
         # Create correction record
         correction = InvoiceCorrection(
             invoice_id=invoice_id,
-            original_data=InvoiceData(**processed_invoices[invoice_id]),
+            original_data=InvoiceData.model_validate(original_invoice),
             corrected_data=corrected_invoice,
             correction_timestamp=datetime.now().isoformat(),
             user_id=user_id,
@@ -598,7 +1154,8 @@ async def log_correction(
         correction_logs.append(correction.model_dump())
 
         # Update the processed invoice with corrections
-        processed_invoices[invoice_id] = corrected_invoice.model_dump()
+        await store_invoice(invoice_id, corrected_invoice.model_dump())
+        vendor_profiles.learn(corrected_invoice, verified=True)
 
         return correction
 
@@ -608,12 +1165,35 @@ async def log_correction(
         raise HTTPException(status_code=500, detail=f"Error processing correction: {str(e)}")
 
 
+@app.get("/api/ingest")
+async def ingestion_status():
+    """
+    Throughput and backlog of the watched-folder ingestion daemon.
+    """
+    if ingestion_daemon is None:
+        return {"enabled": False}
+
+    return {"enabled": True, **ingestion_daemon.stats()}
+
+
 @app.get("/api/health")
 async def health_check():
     """
     Health check endpoint.
     """
-    return {"status": "healthy", "api_key_configured": client is not None}
+    return {
+        "status": "healthy",
+        "api_key_configured": client is not None,
+        "llm": llm_governor.stats(),
+        "extraction": extraction_flights.stats(),
+        "vendor_profiles": vendor_profiles.stats(),
+        "uploads": await asyncio.to_thread(upload_store.stats),
+        "lanes": {
+            "extraction": extraction_lanes.stats(),
+            "rasterization": raster_lanes.stats(),
+            "previews": preview_lanes.stats()
+        }
+    }
 
 
 if __name__ == "__main__":
@@ -93,9 +93,47 @@ class InvoiceCorrection(BaseModel):
     correction_notes: Optional[str] = None
 
 
+class SplitDocument(BaseModel):
+    invoice_id: str
+    first_page: int
+    last_page: int
+    file_path: Optional[str] = None
+    preview_id: Optional[str] = None
+    source_id: str
+    source_file_path: Optional[str] = None
+
+
+class FailedDocument(BaseModel):
+    first_page: int
+    last_page: int
+    error: str
+
+
 class UploadResponse(BaseModel):
     success: bool
     data: Optional[InvoiceData] = None
     error: Optional[str] = None
     invoice_id: Optional[str] = None
     file_path: Optional[str] = None
+    preview_id: Optional[str] = None
+    documents: Optional[List[SplitDocument]] = None
+    failed_documents: Optional[List[FailedDocument]] = None
+
+
+class InvoiceSummary(BaseModel):
+    invoice_id: str
+    invoice_number: Optional[str] = None
+    vendor_name: Optional[str] = None
+    invoice_date: Optional[str] = None
+    total: Optional[float] = None
+    currency: Optional[str] = None
+    discrepancy_detected: bool = False
+    confidence_warning: bool = False
+    source_id: Optional[str] = None
+    first_page: Optional[int] = None
+    last_page: Optional[int] = None
+
+
+class InvoiceSearchResponse(BaseModel):
+    items: List[InvoiceSummary] = Field(default_factory=list)
+    next_cursor: Optional[int] = None
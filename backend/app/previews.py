@@ -0,0 +1,168 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import uuid
+from pathlib import Path
+from typing import Optional
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+# Thumbnail widths (in pixels) rendered for every page
+THUMBNAIL_WIDTHS = (256, 1024)
+
+# Zoom tiles are square and cut from the full-resolution page render
+TILE_SIZE = 512
+
+# Same zoom factor used when rasterizing a PDF page for extraction
+RENDER_ZOOM = 2
+
+# Previews are content-addressed, so they never change once written
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+MANIFEST_NAME = "manifest.json"
+
+
+def is_valid_digest(digest: str) -> bool:
+    """Check that a digest looks like a SHA-256 hex string."""
+    return len(digest) == 64 and all(c in "0123456789abcdef" for c in digest)
+
+
+def preview_dir(root: Path, digest: str) -> Path:
+    """Directory holding the previews for a digest, fanned out by prefix."""
+    return Path(root) / digest[:2] / digest
+
+
+def load_manifest(root: Path, digest: str) -> Optional[dict]:
+    """Load the preview manifest for a digest, or None if not rendered yet."""
+    manifest_path = preview_dir(root, digest) / MANIFEST_NAME
+    if not manifest_path.exists():
+        return None
+    with open(manifest_path, "r") as f:
+        return json.load(f)
+
+
+def resolve_asset(root: Path, digest: str, asset: str) -> Optional[Path]:
+    """Resolve a preview asset path, refusing anything outside the digest directory."""
+    base = preview_dir(root, digest).resolve()
+    path = (base / asset).resolve()
+    if base not in path.parents or not path.is_file():
+        return None
+    return path
+
+
+def detach_previews(root: Path, digest: str) -> Optional[Path]:
+    """
+    Move the previews for a digest out of the served tree, returning their new
+    location so the caller can delete them later, or None if there are none.
+    """
+    target = preview_dir(root, digest)
+    detached = target.parent / f".removed-{digest[:8]}-{uuid.uuid4().hex[:8]}"
+    try:
+        os.rename(target, detached)
+    except FileNotFoundError:
+        return None
+    return detached
+
+
+def _rasterize_pages(file_bytes: bytes, file_type: str, first_page_png: Optional[bytes]):
+    """Yield a PIL image per page, reusing the page 0 render from extraction if given."""
+    if file_type == "pdf":
+        doc = fitz.open(stream=file_bytes, filetype="pdf")
+        for page_number, page in enumerate(doc):
+            if page_number == 0 and first_page_png is not None:
+                png_bytes = first_page_png
+            else:
+                png_bytes = page.get_pixmap(matrix=fitz.Matrix(RENDER_ZOOM, RENDER_ZOOM)).tobytes("png")
+            yield Image.open(io.BytesIO(png_bytes))
+    elif file_type in ["png", "jpg", "jpeg"]:
+        yield Image.open(io.BytesIO(file_bytes))
+    else:
+        raise ValueError(f"Unsupported file type: {file_type}")
+
+
+def _render_page(image: Image.Image, page_dir: Path) -> dict:
+    """Write thumbnails and zoom tiles for a single page and describe them."""
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    width, height = image.size
+    page_dir.mkdir(parents=True)
+
+    thumbnails = {}
+    for thumb_width in THUMBNAIL_WIDTHS:
+        if thumb_width >= width:
+            thumb = image
+        else:
+            thumb = image.resize((thumb_width, round(height * thumb_width / width)), Image.LANCZOS)
+        name = f"thumb_{thumb_width}.png"
+        thumb.save(page_dir / name, "PNG", optimize=True)
+        thumbnails[str(thumb_width)] = f"{page_dir.name}/{name}"
+
+    tiles_dir = page_dir / "tiles"
+    tiles_dir.mkdir()
+    columns = (width + TILE_SIZE - 1) // TILE_SIZE
+    rows = (height + TILE_SIZE - 1) // TILE_SIZE
+    for row in range(rows):
+        for column in range(columns):
+            box = (
+                column * TILE_SIZE,
+                row * TILE_SIZE,
+                min((column + 1) * TILE_SIZE, width),
+                min((row + 1) * TILE_SIZE, height),
+            )
+            image.crop(box).save(tiles_dir / f"{row}_{column}.png", "PNG")
+
+    return {
+        "width": width,
+        "height": height,
+        "thumbnails": thumbnails,
+        "tiles": {
+            "size": TILE_SIZE,
+            "rows": rows,
+            "columns": columns,
+            "path": f"{page_dir.name}/tiles/{{row}}_{{column}}.png",
+        },
+    }
+
+
+def render_previews(
+    root: Path,
+    digest: str,
+    file_bytes: bytes,
+    file_type: str,
+    first_page_png: Optional[bytes] = None,
+) -> dict:
+    """
+    Render thumbnails and zoom tiles for every page of a file.
+
+    Output is written to a temporary directory and moved into place once
+    complete, so readers never see a half-rendered preview set. Files with the
+    same content share one set of previews.
+    """
+    manifest = load_manifest(root, digest)
+    if manifest is not None:
+        return manifest
+
+    target = preview_dir(root, digest)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix=f".{digest[:8]}-", dir=target.parent))
+    try:
+        pages = []
+        for page_number, image in enumerate(_rasterize_pages(file_bytes, file_type, first_page_png)):
+            pages.append(_render_page(image, staging / f"p{page_number}"))
+
+        manifest = {"id": digest, "page_count": len(pages), "pages": pages}
+        with open(staging / MANIFEST_NAME, "w") as f:
+            json.dump(manifest, f)
+
+        try:
+            os.rename(staging, target)
+        except OSError:
+            # Another request rendered the same content first
+            shutil.rmtree(staging, ignore_errors=True)
+        return manifest
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
@@ -0,0 +1,181 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Tuple, Union
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+
+# Completions counted in the per-minute throughput figure
+THROUGHPUT_WINDOW_SECONDS = 60
+
+
+class _Lane:
+    def __init__(self, name: str, weight: float, max_concurrency: Optional[int]):
+        self.name = name
+        self.weight = weight
+        self.max_concurrency = max_concurrency
+        self.waiters = deque()
+        self.running = 0
+        self.completed = 0
+        # Virtual time for weighted fair sharing; the lane with the lowest value goes next
+        self.pass_value = 0.0
+        self.waits = deque(maxlen=500)
+        self.completions = deque()
+
+    def eligible(self) -> bool:
+        return bool(self.waiters) and (self.max_concurrency is None or self.running < self.max_concurrency)
+
+
+class SharedPriority:
+    """
+    The lane of work that several callers wait on (see ``SingleFlight``).
+
+    ``LaneScheduler.slot`` accepts one in place of a lane name. ``escalate``
+    raises it to a lane with a higher weight and moves any slot request still
+    queued under it to that lane, so a caller joining shared work is not held
+    back by the lane of whoever started it. Stages that start later use the
+    raised lane.
+    """
+
+    def __init__(self, lane: str, lane_weights: Dict[str, float]):
+        self.lane = lane
+        self.lane_weights = lane_weights
+        # Slot requests waiting under this priority, and the scheduler holding each
+        self._queued: Dict[asyncio.Future, "LaneScheduler"] = {}
+
+    def escalate(self, lane: str):
+        if self.lane_weights.get(lane, 1.0) <= self.lane_weights.get(self.lane, 1.0):
+            return
+        self.lane = lane
+        for granted, scheduler in list(self._queued.items()):
+            scheduler._move(granted, lane)
+
+
+class LaneScheduler:
+    """
+    Shares a fixed number of slots for one resource between priority lanes.
+
+    When a slot frees up it goes to the eligible lane that has received the
+    least service relative to its weight (stride scheduling), so a lane with
+    weight 4 gets four slots for every one a weight 1 lane gets while both are
+    busy, and either lane can use all the capacity when the other is idle.
+    Each lane can also be capped below the total capacity; a capped lane never
+    gets more than ``capacity - 1`` slots, so one is always left for the
+    others.
+    """
+
+    def __init__(self, name: str, capacity: int, lanes: Dict[str, Tuple[float, Optional[int]]]):
+        self.name = name
+        self.capacity = capacity
+        self.running = 0
+        self.lanes = {
+            lane_name: _Lane(
+                lane_name,
+                weight,
+                max(1, min(max_concurrency, capacity - 1)) if max_concurrency is not None else None,
+            )
+            for lane_name, (weight, max_concurrency) in lanes.items()
+        }
+        self._virtual_time = 0.0
+
+    @asynccontextmanager
+    async def slot(self, lane: Union[str, SharedPriority]):
+        """
+        Hold one slot of this resource for the duration of the block. With a
+        ``SharedPriority``, the request follows it if it is escalated while
+        queued.
+        """
+        priority = lane if isinstance(lane, SharedPriority) else None
+        queued_lane = self.lanes[priority.lane if priority is not None else lane]
+        self._activate(queued_lane)
+
+        granted = asyncio.get_running_loop().create_future()
+        queued_lane.waiters.append((granted, time.monotonic()))
+        if priority is not None:
+            priority._queued[granted] = self
+        self._dispatch()
+        try:
+            # Resolves to the lane the slot was granted in, which may differ after an escalation
+            lane = await granted
+        except asyncio.CancelledError:
+            if granted.done() and not granted.cancelled():
+                self._release(granted.result())
+            else:
+                for candidate in self.lanes.values():
+                    candidate.waiters = deque(w for w in candidate.waiters if w[0] is not granted)
+            raise
+        finally:
+            if priority is not None:
+                priority._queued.pop(granted, None)
+
+        try:
+            yield
+        finally:
+            self._release(lane)
+
+    def _activate(self, lane: _Lane):
+        if not lane.waiters and lane.running == 0:
+            # An idle lane does not bank credit while it has nothing to run
+            lane.pass_value = max(lane.pass_value, self._virtual_time)
+
+    def _move(self, granted: asyncio.Future, lane_name: str):
+        """Move a queued slot request to another lane, keeping its original enqueue time."""
+        target = self.lanes[lane_name]
+        for lane in self.lanes.values():
+            for waiter in lane.waiters:
+                if waiter[0] is granted:
+                    if lane is target:
+                        return
+                    lane.waiters.remove(waiter)
+                    self._activate(target)
+                    target.waiters.append(waiter)
+                    self._dispatch()
+                    return
+
+    def _dispatch(self):
+        while self.running < self.capacity:
+            eligible = [lane for lane in self.lanes.values() if lane.eligible()]
+            if not eligible:
+                return
+            lane = min(eligible, key=lambda candidate: candidate.pass_value)
+            granted, enqueued_at = lane.waiters.popleft()
+            if granted.cancelled():
+                continue
+            self._virtual_time = lane.pass_value
+            lane.pass_value += 1.0 / lane.weight
+            lane.running += 1
+            self.running += 1
+            lane.waits.append(time.monotonic() - enqueued_at)
+            granted.set_result(lane)
+
+    def _release(self, lane: _Lane):
+        lane.running -= 1
+        self.running -= 1
+        lane.completed += 1
+        now = time.monotonic()
+        lane.completions.append(now)
+        self._trim_completions(lane, now)
+        self._dispatch()
+
+    @staticmethod
+    def _trim_completions(lane: _Lane, now: float):
+        while lane.completions and now - lane.completions[0] > THROUGHPUT_WINDOW_SECONDS:
+            lane.completions.popleft()
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        lanes = {}
+        for lane in self.lanes.values():
+            self._trim_completions(lane, now)
+            waits = sorted(lane.waits)
+            lanes[lane.name] = {
+                "queued": len(lane.waiters),
+                "running": lane.running,
+                "completed": lane.completed,
+                "per_minute": len(lane.completions),
+                "queue_seconds_p50": round(waits[len(waits) // 2], 3) if waits else None,
+                "queue_seconds_p95": round(waits[int(0.95 * (len(waits) - 1))], 3) if waits else None,
+            }
+        return {"capacity": self.capacity, "running": self.running, "lanes": lanes}
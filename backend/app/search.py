@@ -0,0 +1,259 @@
+import re
+import sqlite3
+import threading
+from typing import Iterator, List, Optional, Tuple
+
+try:
+    from app.models import InvoiceData
+except ImportError:
+    from models import InvoiceData
+
+MAX_PAGE_SIZE = 500
+
+# Invoices read per lock hold when iterating over the whole index
+ITER_BATCH_SIZE = 500
+
+
+def normalize_vendor(name: Optional[str]) -> Optional[str]:
+    """Lowercase and collapse whitespace so vendor lookups ignore formatting."""
+    if not name:
+        return None
+    return " ".join(name.lower().split())
+
+
+def _fts_query(text: str) -> Optional[str]:
+    """Turn free text into an FTS5 query matching all words as prefixes."""
+    words = re.findall(r"\w+", text.lower())
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+
+class InvoiceIndex:
+    """
+    SQLite index over processed invoices.
+
+    Each invoice is stored as JSON alongside indexed columns for the common
+    filters, and its line item descriptions and additional information are
+    indexed in an FTS5 table for text search. Results are ordered newest first
+    and paginated by row id, so deep pages cost the same as the first one.
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS invoices (
+                id INTEGER PRIMARY KEY,
+                invoice_id TEXT NOT NULL UNIQUE,
+                invoice_number TEXT,
+                vendor_name TEXT,
+                vendor_key TEXT,
+                vendor_tax_id TEXT,
+                invoice_date TEXT,
+                total REAL,
+                currency TEXT,
+                discrepancy_detected INTEGER NOT NULL DEFAULT 0,
+                confidence_warning INTEGER NOT NULL DEFAULT 0,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS invoices_vendor ON invoices(vendor_key, id);
+            CREATE INDEX IF NOT EXISTS invoices_date ON invoices(invoice_date, id);
+            CREATE INDEX IF NOT EXISTS invoices_total ON invoices(total, id);
+            CREATE INDEX IF NOT EXISTS invoices_currency ON invoices(currency, id);
+            CREATE INDEX IF NOT EXISTS invoices_flags ON invoices(discrepancy_detected, confidence_warning, id);
+            CREATE VIRTUAL TABLE IF NOT EXISTS invoice_text USING fts5(line_items, additional_information);
+            CREATE TABLE IF NOT EXISTS invoice_sources (
+                invoice_id TEXT PRIMARY KEY,
+                source_id TEXT NOT NULL,
+                first_page INTEGER NOT NULL,
+                last_page INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS invoice_sources_source ON invoice_sources(source_id);
+            """
+        )
+        self._db.commit()
+
+    def upsert(self, invoice_id: str, invoice: InvoiceData):
+        """Index a new invoice or replace the entry for a corrected one."""
+        descriptions = "\n".join(item.description for item in invoice.line_items if item.description)
+        columns = (
+            invoice.invoice_number,
+            invoice.vendor.name,
+            normalize_vendor(invoice.vendor.name),
+            invoice.vendor.tax_id,
+            (invoice.invoice_date or "")[:10] or None,
+            invoice.total,
+            invoice.currency.upper() if invoice.currency else None,
+            int(invoice.flags.discrepancy_detected),
+            int(invoice.flags.confidence_warning),
+            invoice.model_dump_json(),
+        )
+        with self._lock:
+            row = self._db.execute("SELECT id FROM invoices WHERE invoice_id = ?", (invoice_id,)).fetchone()
+            if row is None:
+                cursor = self._db.execute(
+                    "INSERT INTO invoices (invoice_id, invoice_number, vendor_name, vendor_key, vendor_tax_id, "
+                    "invoice_date, total, currency, discrepancy_detected, confidence_warning, data) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (invoice_id, *columns),
+                )
+                row_id = cursor.lastrowid
+            else:
+                row_id = row[0]
+                self._db.execute(
+                    "UPDATE invoices SET invoice_number = ?, vendor_name = ?, vendor_key = ?, vendor_tax_id = ?, "
+                    "invoice_date = ?, total = ?, currency = ?, discrepancy_detected = ?, "
+                    "confidence_warning = ?, data = ? WHERE id = ?",
+                    (*columns, row_id),
+                )
+                self._db.execute("DELETE FROM invoice_text WHERE rowid = ?", (row_id,))
+            self._db.execute(
+                "INSERT INTO invoice_text (rowid, line_items, additional_information) VALUES (?, ?, ?)",
+                (row_id, descriptions, invoice.additional_information or ""),
+            )
+            self._db.commit()
+
+    def link_source(self, invoice_id: str, source_id: str, first_page: int, last_page: int):
+        """Record that an invoice was split out of pages of a larger source file."""
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO invoice_sources (invoice_id, source_id, first_page, last_page) "
+                "VALUES (?, ?, ?, ?)",
+                (invoice_id, source_id, first_page, last_page),
+            )
+            self._db.commit()
+
+    def get(self, invoice_id: str) -> Optional[InvoiceData]:
+        with self._lock:
+            row = self._db.execute("SELECT data FROM invoices WHERE invoice_id = ?", (invoice_id,)).fetchone()
+        if row is None:
+            return None
+        return InvoiceData.model_validate_json(row[0])
+
+    @staticmethod
+    def _common_filters(vendor: Optional[str], start_date: Optional[str], end_date: Optional[str]):
+        """WHERE clauses and parameters for the filters shared by search and export."""
+        clauses = []
+        params = []
+        vendor_key = normalize_vendor(vendor)
+        if vendor_key:
+            clauses.append("vendor_key >= ? AND vendor_key < ?")
+            params += [vendor_key, vendor_key + "\U0010ffff"]
+        if start_date:
+            clauses.append("invoice_date >= ?")
+            params.append(start_date)
+        if end_date:
+            clauses.append("invoice_date <= ?")
+            params.append(end_date)
+        return clauses, params
+
+    def iter_invoices(
+        self,
+        vendor: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+    ) -> Iterator[Tuple[str, InvoiceData]]:
+        """
+        Yield ``(invoice_id, InvoiceData)`` for every matching invoice, oldest first.
+
+        Filters behave as in ``search``. Rows are read in batches by row id, so
+        the lock is not held while the caller consumes them and invoices
+        added during iteration are picked up at the end.
+        """
+        clauses, params = self._common_filters(vendor, start_date, end_date)
+        last_id = 0
+        while True:
+            where = " AND ".join(clauses + ["id > ?"])
+            with self._lock:
+                rows = self._db.execute(
+                    f"SELECT id, invoice_id, data FROM invoices WHERE {where} ORDER BY id LIMIT ?",
+                    (*params, last_id, ITER_BATCH_SIZE),
+                ).fetchall()
+            for _, invoice_id, data in rows:
+                yield invoice_id, InvoiceData.model_validate_json(data)
+            if len(rows) < ITER_BATCH_SIZE:
+                return
+            last_id = rows[-1][0]
+
+    def search(
+        self,
+        vendor: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        min_total: Optional[float] = None,
+        max_total: Optional[float] = None,
+        currency: Optional[str] = None,
+        discrepancy_detected: Optional[bool] = None,
+        confidence_warning: Optional[bool] = None,
+        text: Optional[str] = None,
+        source_id: Optional[str] = None,
+        limit: int = 50,
+        cursor: Optional[int] = None,
+    ) -> Tuple[List[dict], Optional[int]]:
+        """
+        Return one page of matching invoice summaries and the cursor for the next page.
+
+        ``vendor`` matches normalized vendor names by prefix, ``text``
+        matches words in line item descriptions or additional information and
+        ``source_id`` selects invoices split out of one multi-invoice file.
+        """
+        clauses, params = self._common_filters(vendor, start_date, end_date)
+        if min_total is not None:
+            clauses.append("total >= ?")
+            params.append(min_total)
+        if max_total is not None:
+            clauses.append("total <= ?")
+            params.append(max_total)
+        if currency:
+            clauses.append("currency = ?")
+            params.append(currency.upper())
+        if discrepancy_detected is not None:
+            clauses.append("discrepancy_detected = ?")
+            params.append(int(discrepancy_detected))
+        if confidence_warning is not None:
+            clauses.append("confidence_warning = ?")
+            params.append(int(confidence_warning))
+        if text:
+            match = _fts_query(text)
+            if match is None:
+                return [], None
+            clauses.append("id IN (SELECT rowid FROM invoice_text WHERE invoice_text MATCH ?)")
+            params.append(match)
+        if source_id:
+            clauses.append("invoice_sources.source_id = ?")
+            params.append(source_id)
+        if cursor is not None:
+            clauses.append("id < ?")
+            params.append(cursor)
+
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        query = (
+            "SELECT id, invoices.invoice_id, invoice_number, vendor_name, invoice_date, total, currency, "
+            "discrepancy_detected, confidence_warning, source_id, first_page, last_page "
+            f"FROM invoices LEFT JOIN invoice_sources USING (invoice_id) {where} ORDER BY id DESC LIMIT ?"
+        )
+        with self._lock:
+            rows = self._db.execute(query, (*params, limit + 1)).fetchall()
+
+        items = [
+            {
+                "invoice_id": row[1],
+                "invoice_number": row[2],
+                "vendor_name": row[3],
+                "invoice_date": row[4],
+                "total": row[5],
+                "currency": row[6],
+                "discrepancy_detected": bool(row[7]),
+                "confidence_warning": bool(row[8]),
+                "source_id": row[9],
+                "first_page": row[10],
+                "last_page": row[11],
+            }
+            for row in rows[:limit]
+        ]
+        next_cursor = rows[limit - 1][0] if len(rows) > limit else None
+        return items, next_cursor
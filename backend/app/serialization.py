@@ -0,0 +1,129 @@
+import gzip
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip is always available
+    brotli = None
+
+try:
+    from app.models import InvoiceData
+except ImportError:
+    from models import InvoiceData
+
+# Bodies smaller than this are sent uncompressed
+COMPRESSION_MIN_BYTES = 1024
+
+# Serialized invoices kept in memory, least recently used evicted first
+RESPONSE_CACHE_SIZE = 1024
+
+
+class SerializedInvoice:
+    """JSON bytes for one invoice version, plus lazily compressed variants."""
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self._digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+        self.etag = f'"{self._digest}"'
+        self._encoded: Dict[str, bytes] = {}
+
+    def etag_for(self, encoding: Optional[str]) -> str:
+        """Strong ETag of the body as sent with the given content coding."""
+        return f'"{self._digest}-{encoding}"' if encoding else self.etag
+
+    @property
+    def etags(self) -> list:
+        """ETags of every representation this body can be sent as."""
+        return [self.etag, self.etag_for("gzip"), self.etag_for("br")]
+
+    def encoded(self, encoding: str) -> bytes:
+        if encoding not in self._encoded:
+            if encoding == "br":
+                self._encoded[encoding] = brotli.compress(self.body, quality=5)
+            else:
+                self._encoded[encoding] = gzip.compress(self.body, compresslevel=6)
+        return self._encoded[encoding]
+
+
+class InvoiceResponseCache:
+    """
+    Cache of serialized invoices keyed by invoice id.
+
+    Each invoice is validated and serialized once, with the same output the
+    ``InvoiceData`` response model would produce, and reused until it is
+    invalidated by a correction. Only the ``max_entries`` most recently used
+    invoices are kept.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, SerializedInvoice]" = OrderedDict()
+
+    def get(self, invoice_id: str, invoice) -> SerializedInvoice:
+        entry = self._entries.get(invoice_id)
+        if entry is not None:
+            self._entries.move_to_end(invoice_id)
+            return entry
+        if not isinstance(invoice, InvoiceData):
+            invoice = InvoiceData.model_validate(invoice)
+        entry = SerializedInvoice(invoice.model_dump_json().encode())
+        self._entries[invoice_id] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, invoice_id: str):
+        self._entries.pop(invoice_id, None)
+
+
+def etag_matches(if_none_match: Optional[str], etags: Iterable[str]) -> bool:
+    """
+    Check an If-None-Match header against our ETags.
+
+    Uses the weak comparison If-None-Match calls for, so ``W/`` prefixed tags
+    (as proxies produce when they re-encode a body) still match, and accepts
+    a list of tags or ``*``.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return any(etag.removeprefix("W/") in candidates for etag in etags)
+
+
+def choose_encoding(accept_encoding: Optional[str], body_size: int) -> Optional[str]:
+    """Pick the best supported content encoding the client accepts."""
+    if not accept_encoding or body_size < COMPRESSION_MIN_BYTES:
+        return None
+    accepted = set()
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0"):
+            continue
+        accepted.add(coding.strip().lower())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def upload_response_body(result: dict, invoice_body: bytes) -> bytes:
+    """Assemble an ``UploadResponse`` JSON body around already serialized invoice data."""
+    envelope = json.dumps({
+        "success": result["success"],
+        "data": None,
+        "error": result.get("error"),
+        "invoice_id": result.get("invoice_id"),
+        "file_path": result.get("file_path"),
+        "preview_id": result.get("preview_id"),
+        "documents": result.get("documents"),
+        "failed_documents": result.get("failed_documents"),
+    }, separators=(",", ":"))
+    # Splice the cached invoice bytes in place of the null placeholder
+    head, tail = envelope.split('"data":null', 1)
+    return head.encode() + b'"data":' + invoice_body + tail.encode()
@@ -0,0 +1,64 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+try:
+    from app.scheduler import SharedPriority
+except ImportError:
+    from scheduler import SharedPriority
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into one in-flight task.
+
+    The first caller for a key starts the work; callers arriving while it runs
+    wait on the same future and receive the same result (or exception). The
+    task is shielded, so a caller disconnecting does not cancel the work for
+    everyone else.
+
+    Work started with a ``SharedPriority`` is escalated to the lane of each
+    caller that joins it, so a flight never runs in a lower lane than the
+    most urgent caller waiting on it.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, Tuple[asyncio.Future, Optional[SharedPriority]]] = {}
+        # Total callers that joined an existing flight instead of starting one
+        self.coalesced = 0
+        # Callers currently waiting on someone else's flight
+        self.waiting = 0
+        # Joining callers that raised a flight to their lane
+        self.escalated = 0
+
+    async def run(self, key: str, work: Callable[[], Awaitable], priority: Optional[SharedPriority] = None):
+        """
+        Run ``work`` for ``key``, or join the flight already running it.
+        ``priority`` is the one ``work`` schedules under, or the caller's lane
+        when joining.
+        """
+        if key in self._flights:
+            flight, flight_priority = self._flights[key]
+            if priority is not None and flight_priority is not None:
+                lane = flight_priority.lane
+                flight_priority.escalate(priority.lane)
+                if flight_priority.lane != lane:
+                    self.escalated += 1
+            self.coalesced += 1
+            self.waiting += 1
+            try:
+                return await asyncio.shield(flight)
+            finally:
+                self.waiting -= 1
+
+        flight = asyncio.ensure_future(work())
+        self._flights[key] = (flight, priority)
+        flight.add_done_callback(lambda _: self._flights.pop(key, None))
+        return await asyncio.shield(flight)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._flights),
+            "waiting": self.waiting,
+            "coalesced": self.coalesced,
+            "escalated": self.escalated,
+        }
@@ -0,0 +1,101 @@
+import re
+from typing import List, Optional, Tuple
+
+import fitz  # PyMuPDF
+
+# "Invoice # 1234", "Invoice No. INV-77", "Invoice Number:\n2025-001"
+INVOICE_NUMBER_PATTERN = re.compile(
+    r"\binvoice\s*(?:#|no\b\.?|number|num\b\.?)\s*[:#.]?\s*([A-Z0-9][A-Z0-9\-/]*)", re.IGNORECASE
+)
+
+# "Page 1 of 3", "Page 2/5"
+PAGE_NUMBER_PATTERN = re.compile(r"\bpage\s+(\d+)\s*(?:of|/)\s*\d+\b", re.IGNORECASE)
+
+# A title such as "INVOICE" or "Tax Invoice" near the top of the page
+HEADING_PATTERN = re.compile(r"^\s*(?:tax\s+|commercial\s+)?invoice\s*$", re.IGNORECASE | re.MULTILINE)
+HEADING_REGION = 0.25
+
+
+def _page_signals(page) -> dict:
+    text = page.get_text()
+
+    invoice_number = None
+    for match in INVOICE_NUMBER_PATTERN.finditer(text):
+        # Real invoice numbers contain a digit; this skips "Invoice No: see below" and similar
+        if any(c.isdigit() for c in match.group(1)):
+            invoice_number = match.group(1).upper()
+            break
+
+    page_number = PAGE_NUMBER_PATTERN.search(text)
+    heading_limit = page.rect.height * HEADING_REGION
+    heading = any(
+        block[1] < heading_limit and HEADING_PATTERN.search(block[4])
+        for block in page.get_text("blocks")
+    )
+    return {
+        "invoice_number": invoice_number,
+        "page_number": int(page_number.group(1)) if page_number else None,
+        "heading": heading,
+        "size": (round(page.rect.width), round(page.rect.height)),
+    }
+
+
+def find_invoice_boundaries(file_bytes: bytes) -> List[Tuple[int, int]]:
+    """
+    Split a PDF's pages into ranges that each hold one invoice.
+
+    Uses only the text layer, so it is cheap enough to run on every upload. A
+    page starts a new invoice when its page numbering restarts ("Page 1 of
+    N"), when it shows a different invoice number than the current invoice,
+    or when it has an invoice heading and a different page size than the page
+    before it. Pages numbered 2 or higher always continue the current invoice,
+    and pages without a text layer (plain scans) never start a new one.
+    Returns inclusive, zero-based ``(first_page, last_page)`` ranges.
+    """
+    doc = fitz.open(stream=file_bytes, filetype="pdf")
+    if doc.page_count == 0:
+        return []
+
+    ranges = []
+    first_page = 0
+    previous = _page_signals(doc[0])
+    current_number = previous["invoice_number"]
+    for page_index in range(1, doc.page_count):
+        signals = _page_signals(doc[page_index])
+        if signals["page_number"] is not None:
+            starts_invoice = signals["page_number"] == 1
+        elif signals["invoice_number"] and current_number:
+            starts_invoice = signals["invoice_number"] != current_number
+        else:
+            starts_invoice = signals["heading"] and signals["size"] != previous["size"]
+
+        if starts_invoice:
+            ranges.append((first_page, page_index - 1))
+            first_page = page_index
+            current_number = signals["invoice_number"]
+        elif current_number is None:
+            current_number = signals["invoice_number"]
+        previous = signals
+
+    ranges.append((first_page, doc.page_count - 1))
+    return ranges
+
+
+def split_invoices(file_bytes: bytes) -> Optional[List[Tuple[int, int, bytes]]]:
+    """
+    Split a PDF holding several invoices into one PDF per invoice.
+
+    Returns ``(first_page, last_page, pdf_bytes)`` for each invoice, or None if
+    the file holds a single invoice.
+    """
+    ranges = find_invoice_boundaries(file_bytes)
+    if len(ranges) <= 1:
+        return None
+
+    source = fitz.open(stream=file_bytes, filetype="pdf")
+    segments = []
+    for first_page, last_page in ranges:
+        segment = fitz.open()
+        segment.insert_pdf(source, from_page=first_page, to_page=last_page)
+        segments.append((first_page, last_page, segment.tobytes(garbage=3, deflate=True)))
+    return segments
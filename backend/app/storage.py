@@ -0,0 +1,272 @@
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, List, Optional
+
+# Files deleted per lock hold during compaction
+COMPACTION_BATCH = 200
+
+
+@dataclass
+class StoredUpload:
+    digest: str
+    extension: str
+    size: int
+    relative_path: str
+    created: bool
+
+
+class UploadStore:
+    """
+    Content-addressed store for uploaded invoice files.
+
+    Files are named by the SHA-256 of their content and fanned out into two
+    levels of subdirectories (``ab/cd/abcd....pdf``), so identical uploads are
+    stored once and no directory grows unbounded. A small SQLite index records
+    which invoice ids reference each file so files can be reclaimed once
+    nothing points at them.
+
+    The lock only guards the index and quick renames: file contents are
+    written to a staging directory and deleted from a trash directory
+    without holding it.
+
+    ``on_detach`` is called with the lock held for every file removed, so
+    data derived from it (such as previews) goes with it. It may move that
+    data aside and return the new path, which is deleted along with the file.
+    """
+
+    def __init__(self, root: str, index_path: str, on_detach: Optional[Callable[[str], Optional[Path]]] = None):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._staging = self.root / ".staging"
+        self._trash = self.root / ".trash"
+        # Leftovers from an interrupted run are never referenced by the index
+        for directory in (self._staging, self._trash):
+            shutil.rmtree(directory, ignore_errors=True)
+            directory.mkdir()
+        self._lock = threading.Lock()
+        self.on_detach = on_detach
+        # Uploads that are saved but not yet attached to an invoice
+        self._pending = Counter()
+        self._db = sqlite3.connect(index_path, check_same_thread=False)
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS blobs (
+                digest TEXT PRIMARY KEY,
+                extension TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS refs (
+                invoice_id TEXT PRIMARY KEY,
+                digest TEXT NOT NULL REFERENCES blobs(digest)
+            );
+            CREATE INDEX IF NOT EXISTS refs_digest ON refs(digest);
+            CREATE INDEX IF NOT EXISTS blobs_last_used ON blobs(last_used_at);
+            """
+        )
+        self._db.commit()
+
+    @staticmethod
+    def relative_path(digest: str, extension: str) -> str:
+        return f"{digest[:2]}/{digest[2:4]}/{digest}.{extension}"
+
+    def path_for(self, digest: str, extension: str) -> Path:
+        return self.root / self.relative_path(digest, extension)
+
+    def put(self, file_bytes: bytes, extension: str) -> StoredUpload:
+        """
+        Save a file unless identical content is already stored.
+
+        The upload is pinned until ``commit`` or ``abandon`` is called so that
+        compaction never removes a file that is still being processed. This
+        does blocking file I/O; call it from a worker thread.
+        """
+        digest = hashlib.sha256(file_bytes).hexdigest()
+        with self._lock:
+            row = self._db.execute("SELECT extension FROM blobs WHERE digest = ?", (digest,)).fetchone()
+            if row is not None:
+                extension = row[0]
+            path = self.path_for(digest, extension)
+            self._pending[digest] += 1
+            created = not path.exists()
+
+        try:
+            if created:
+                staged_path = self._staging / f"{digest}.{uuid.uuid4().hex}"
+                with open(staged_path, "wb") as buffer:
+                    buffer.write(file_bytes)
+            now = time.time()
+            with self._lock:
+                if created:
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    os.replace(staged_path, path)
+                self._db.execute(
+                    "INSERT INTO blobs (digest, extension, size, created_at, last_used_at) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT(digest) DO UPDATE SET last_used_at = excluded.last_used_at",
+                    (digest, extension, len(file_bytes), now, now),
+                )
+                self._db.commit()
+        except Exception:
+            with self._lock:
+                self._unpin(digest)
+            if created:
+                staged_path.unlink(missing_ok=True)
+            raise
+
+        return StoredUpload(
+            digest=digest,
+            extension=extension,
+            size=len(file_bytes),
+            relative_path=self.relative_path(digest, extension),
+            created=created,
+        )
+
+    def commit(self, digest: str, invoice_id: str):
+        """Attach a pinned upload to an invoice id."""
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO refs (invoice_id, digest) VALUES (?, ?)", (invoice_id, digest))
+            self._db.commit()
+            self._unpin(digest)
+
+    def abandon(self, digest: str) -> bool:
+        """Release a pinned upload, deleting it if nothing else references it."""
+        with self._lock:
+            self._unpin(digest)
+            if self._pending[digest] or self._ref_count(digest):
+                return False
+            trashed = self._detach(digest)
+            self._db.commit()
+        if not trashed:
+            return False
+        self._unlink(trashed)
+        return True
+
+    def compact(self, max_age_seconds: Optional[float] = None, max_total_bytes: Optional[int] = None,
+                orphan_grace_seconds: float = 3600) -> dict:
+        """
+        Apply the retention policy.
+
+        Unreferenced files are removed once they are older than the grace
+        period. Files not used within ``max_age_seconds`` are removed along
+        with their references, and if the store still exceeds
+        ``max_total_bytes`` the least recently used files are evicted.
+
+        Victims are chosen in one pass over the index, then removed in
+        batches; the lock is held only to detach each batch, never while
+        deleting files.
+        """
+        now = time.time()
+        with self._lock:
+            victims = dict(self._db.execute(
+                "SELECT digest, size FROM blobs WHERE last_used_at < ? "
+                "AND digest NOT IN (SELECT digest FROM refs)",
+                (now - orphan_grace_seconds,),
+            ).fetchall())
+            if max_age_seconds is not None:
+                victims.update(self._db.execute(
+                    "SELECT digest, size FROM blobs WHERE last_used_at < ? "
+                    "AND digest IN (SELECT digest FROM refs)",
+                    (now - max_age_seconds,),
+                ).fetchall())
+            victims = {digest: size for digest, size in victims.items() if not self._pending[digest]}
+
+            if max_total_bytes is not None:
+                total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+                total -= sum(victims.values())
+                if total > max_total_bytes:
+                    for digest, size in self._db.execute(
+                        "SELECT digest, size FROM blobs ORDER BY last_used_at"
+                    ).fetchall():
+                        if total <= max_total_bytes:
+                            break
+                        if digest not in victims and not self._pending[digest]:
+                            victims[digest] = size
+                            total -= size
+
+        removed = 0
+        freed = 0
+        candidates = list(victims.items())
+        for start in range(0, len(candidates), COMPACTION_BATCH):
+            batch = candidates[start:start + COMPACTION_BATCH]
+            trashed = []
+            with self._lock:
+                for digest, size in batch:
+                    # The file may have been uploaded again since it was chosen
+                    if self._pending[digest]:
+                        continue
+                    paths = self._detach(digest)
+                    if paths:
+                        trashed.extend(paths)
+                        removed += 1
+                        freed += size
+                self._db.commit()
+            self._unlink(trashed)
+
+        return {"removed": removed, "freed_bytes": freed}
+
+    def stats(self) -> dict:
+        with self._lock:
+            blobs, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+            refs = self._db.execute("SELECT COUNT(*) FROM refs").fetchone()[0]
+        return {"files": blobs, "bytes": total, "references": refs}
+
+    def _unpin(self, digest: str):
+        if self._pending[digest] > 1:
+            self._pending[digest] -= 1
+        else:
+            self._pending.pop(digest, None)
+
+    def _ref_count(self, digest: str) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM refs WHERE digest = ?", (digest,)).fetchone()[0]
+
+    def _detach(self, digest: str) -> List[Path]:
+        """
+        Remove a file from the index and move it, and anything ``on_detach``
+        moves aside, into the trash, returning the paths to delete. Must be
+        called with the lock held; the caller commits and deletes the trashed
+        paths after releasing the lock.
+        """
+        row = self._db.execute("SELECT extension FROM blobs WHERE digest = ?", (digest,)).fetchone()
+        if row is None:
+            return []
+        path = self.path_for(digest, row[0])
+        trashed = self._trash / f"{digest}.{uuid.uuid4().hex}"
+        try:
+            os.replace(path, trashed)
+        except FileNotFoundError:
+            pass
+        # Remove the fan-out directories once they are empty
+        for parent in (path.parent, path.parent.parent):
+            try:
+                parent.rmdir()
+            except OSError:
+                break
+        self._db.execute("DELETE FROM refs WHERE digest = ?", (digest,))
+        self._db.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+        trashed = [trashed]
+        if self.on_detach is not None:
+            try:
+                companion = self.on_detach(digest)
+            except OSError as e:
+                print(f"Could not remove data derived from {digest}: {str(e)}")
+                companion = None
+            if companion is not None:
+                trashed.append(companion)
+        return trashed
+
+    @staticmethod
+    def _unlink(paths: List[Path]):
+        for path in paths:
+            if path.is_dir():
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                path.unlink(missing_ok=True)
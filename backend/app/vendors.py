@@ -0,0 +1,197 @@
+import json
+import re
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+try:
+    from app.models import CustomerInfo, InvoiceData, VendorInfo
+    from app.search import normalize_vendor
+except ImportError:
+    from models import CustomerInfo, InvoiceData, VendorInfo
+    from search import normalize_vendor
+
+# Extracted (not corrected) vendor and customer fields must be at least this
+# confident before they are cached
+MIN_PROFILE_CONFIDENCE = 0.9
+
+VENDOR_FIELDS = list(VendorInfo.model_fields.keys())
+CUSTOMER_FIELDS = list(CustomerInfo.model_fields.keys())
+
+
+def normalize_tax_id(tax_id: Optional[str]) -> Optional[str]:
+    if not tax_id:
+        return None
+    normalized = re.sub(r"[^0-9A-Za-z]", "", tax_id).upper()
+    return normalized or None
+
+
+def _values(party, fields) -> dict:
+    """Field values without their confidence scores."""
+    return {field: getattr(party, field) for field in fields if not field.endswith("_confidence")}
+
+
+def _confident(party, fields) -> bool:
+    for field in fields:
+        if field.endswith("_confidence"):
+            continue
+        confidence = getattr(party, f"{field}_confidence")
+        if getattr(party, field) is not None and confidence is not None and confidence < MIN_PROFILE_CONFIDENCE:
+            return False
+    return True
+
+
+class VendorProfileCache:
+    """
+    Stable vendor and customer details per vendor, keyed by tax id and by
+    normalized vendor name.
+
+    Profiles are learned from corrected invoices and from confidently
+    extracted ones; corrected (verified) profiles are never overwritten by
+    model output. For a known vendor the model can skip these fields and they
+    are filled in from the cache after a consistency check.
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS profiles (
+                id INTEGER PRIMARY KEY,
+                vendor TEXT NOT NULL,
+                customer TEXT NOT NULL,
+                verified INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS profile_keys (
+                key TEXT PRIMARY KEY,
+                profile_id INTEGER NOT NULL REFERENCES profiles(id)
+            );
+            """
+        )
+        self._db.commit()
+        self.hits = 0
+        self.mismatches = 0
+
+    @staticmethod
+    def _keys(name: Optional[str], tax_id: Optional[str]) -> list:
+        keys = []
+        if normalize_tax_id(tax_id):
+            keys.append(f"tax:{normalize_tax_id(tax_id)}")
+        if normalize_vendor(name):
+            keys.append(f"name:{normalize_vendor(name)}")
+        return keys
+
+    def _lookup(self, keys: list) -> Optional[dict]:
+        """Find the profile for the first key that matches, in the order given."""
+        found = {}
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            for key, profile_id in self._db.execute(
+                f"SELECT key, profile_id FROM profile_keys WHERE key IN ({placeholders})", batch
+            ):
+                found[key] = profile_id
+        for key in keys:
+            if key in found:
+                row = self._db.execute(
+                    "SELECT id, vendor, customer, verified FROM profiles WHERE id = ?", (found[key],)
+                ).fetchone()
+                return {"id": row[0], "vendor": json.loads(row[1]), "customer": json.loads(row[2]),
+                        "verified": bool(row[3])}
+        return None
+
+    def learn(self, invoice: InvoiceData, verified: bool = False):
+        """Create or refresh the profile for an invoice's vendor."""
+        keys = self._keys(invoice.vendor.name, invoice.vendor.tax_id)
+        if not keys:
+            return
+        if not verified and not (_confident(invoice.vendor, VENDOR_FIELDS)
+                                 and _confident(invoice.customer, CUSTOMER_FIELDS)):
+            return
+
+        vendor = json.dumps(_values(invoice.vendor, VENDOR_FIELDS))
+        customer = json.dumps(_values(invoice.customer, CUSTOMER_FIELDS))
+        with self._lock:
+            existing = self._lookup(keys)
+            if existing is None:
+                profile_id = self._db.execute(
+                    "INSERT INTO profiles (vendor, customer, verified, updated_at) VALUES (?, ?, ?, ?)",
+                    (vendor, customer, int(verified), time.time()),
+                ).lastrowid
+            elif existing["verified"] and not verified:
+                return
+            else:
+                profile_id = existing["id"]
+                self._db.execute(
+                    "UPDATE profiles SET vendor = ?, customer = ?, verified = ?, updated_at = ? WHERE id = ?",
+                    (vendor, customer, int(verified or existing["verified"]), time.time(), profile_id),
+                )
+            for key in keys:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO profile_keys (key, profile_id) VALUES (?, ?)", (key, profile_id)
+                )
+            self._db.commit()
+
+    def identify(self, text: str) -> Optional[dict]:
+        """
+        Find a known vendor in a document's text layer.
+
+        Tax ids are matched against any token containing digits and names
+        against whole lines; a tax id match wins over a name match.
+        """
+        if not text:
+            return None
+        tax_keys = []
+        for token in re.findall(r"[0-9A-Za-z][0-9A-Za-z\-./ ]{4,}[0-9A-Za-z]", text):
+            if any(c.isdigit() for c in token):
+                for part in {token, *token.split()}:
+                    if normalize_tax_id(part):
+                        tax_keys.append(f"tax:{normalize_tax_id(part)}")
+        name_keys = [f"name:{normalize_vendor(line)}" for line in text.splitlines() if normalize_vendor(line)]
+        with self._lock:
+            return self._lookup(list(dict.fromkeys(tax_keys + name_keys)))
+
+    def apply(self, invoice_data: dict, profile: dict) -> bool:
+        """
+        Fill vendor and customer fields from a profile into raw extracted data.
+
+        The model's ``vendor_check`` must agree with the profile on tax id or
+        name. If it does not, or has nothing to compare (``identify`` may have
+        matched the customer block rather than the vendor), the data is left
+        alone and False is returned; the known-vendor prompt omitted the vendor
+        and customer details, so the caller has to extract the document again
+        with the full prompt.
+        """
+        check = invoice_data.get("vendor_check") or invoice_data.get("vendor") or {}
+        checked_tax_id = normalize_tax_id(check.get("tax_id"))
+        checked_name = normalize_vendor(check.get("name"))
+        cached_tax_id = normalize_tax_id(profile["vendor"].get("tax_id"))
+        cached_name = normalize_vendor(profile["vendor"].get("name"))
+
+        if checked_tax_id and cached_tax_id:
+            matched = checked_tax_id == cached_tax_id
+        elif checked_name and cached_name:
+            matched = checked_name == cached_name
+        else:
+            # An unconfirmed profile could stamp the wrong parties on the invoice
+            matched = False
+
+        if not matched:
+            self.mismatches += 1
+            print(f"Vendor profile mismatch: document shows {check.get('name')!r} / {check.get('tax_id')!r}, "
+                  f"cache has {profile['vendor'].get('name')!r} / {profile['vendor'].get('tax_id')!r}")
+            return False
+
+        self.hits += 1
+        invoice_data.pop("vendor_check", None)
+        invoice_data["vendor"] = dict(profile["vendor"])
+        invoice_data["customer"] = dict(profile["customer"])
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            profiles = self._db.execute("SELECT COUNT(*) FROM profiles").fetchone()[0]
+        return {"profiles": profiles, "hits": self.hits, "mismatches": self.mismatches}
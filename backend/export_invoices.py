@@ -0,0 +1,36 @@
+import argparse
+import os
+import shutil
+import sys
+import urllib.error
+import urllib.parse
+import urllib.request
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export processed invoices from a running backend")
+    parser.add_argument("--format", choices=["csv", "jsonl", "parquet"], default="csv")
+    parser.add_argument("--start-date", help="Earliest invoice_date to include (YYYY-MM-DD)")
+    parser.add_argument("--end-date", help="Latest invoice_date to include (YYYY-MM-DD)")
+    parser.add_argument("--vendor", help="Only include vendors whose name starts with this text")
+    parser.add_argument("--output", "-o", help="Output file (defaults to stdout)")
+    parser.add_argument(
+        "--api-url",
+        default=os.environ.get("API_URL", f"http://localhost:{os.environ.get('PORT', 8081)}/api"),
+    )
+    args = parser.parse_args()
+
+    params = {"format": args.format}
+    for key, value in (("start_date", args.start_date), ("end_date", args.end_date), ("vendor", args.vendor)):
+        if value:
+            params[key] = value
+    url = f"{args.api_url}/export?{urllib.parse.urlencode(params)}"
+
+    try:
+        with urllib.request.urlopen(url) as response:
+            if args.output:
+                with open(args.output, "wb") as out:
+                    shutil.copyfileobj(response, out, length=1024 * 1024)
+            else:
+                shutil.copyfileobj(response, sys.stdout.buffer, length=1024 * 1024)
+    except urllib.error.HTTPError as e:
+        sys.exit(f"Export failed: {e.code} {e.read().decode(errors='replace')}")
@@ -0,0 +1,14 @@
+import asyncio
+import os
+import sys
+
+if __name__ == "__main__":
+    # Directories can be passed as arguments instead of INGEST_DIRS
+    if len(sys.argv) > 1:
+        os.environ["INGEST_DIRS"] = ",".join(sys.argv[1:])
+
+    from app.main import ingestion_daemon
+
+    if ingestion_daemon is None:
+        sys.exit("Usage: python ingest.py DIRECTORY [DIRECTORY ...] (or set INGEST_DIRS)")
+    asyncio.run(ingestion_daemon.run())
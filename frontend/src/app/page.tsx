@@ -5,23 +5,55 @@ import Image from 'next/image';
 import { FiAlertTriangle } from 'react-icons/fi';
 import FileUpload from '../components/FileUpload';
 import InvoiceForm from '../components/InvoiceForm';
-import { InvoiceData } from '../types/invoice';
+import PreviewViewer from '../components/PreviewViewer';
+import { getInvoice } from '../services/api';
+import { FailedDocument, InvoiceData, SplitDocument, UploadResponse } from '../types/invoice';
 
 export default function Home() {
   const [currentStep, setCurrentStep] = useState<'upload' | 'form'>('upload');
   const [invoiceData, setInvoiceData] = useState<InvoiceData | null>(null);
   const [invoiceId, setInvoiceId] = useState<string | null>(null);
   const [filePath, setFilePath] = useState<string | null>(null);
+  const [previewId, setPreviewId] = useState<string | null>(null);
+  // Invoices split out of one multi-invoice PDF, in page order
+  const [documents, setDocuments] = useState<SplitDocument[]>([]);
+  // Invoices of that PDF that could not be extracted, and the server's summary of them
+  const [failedDocuments, setFailedDocuments] = useState<FailedDocument[]>([]);
+  const [uploadWarning, setUploadWarning] = useState<string | null>(null);
   const [error, setError] = useState<string | null>(null);
 
-  const handleUploadSuccess = (data: InvoiceData, id: string, path: string) => {
+  const handleUploadSuccess = (
+    data: InvoiceData,
+    id: string,
+    path: string,
+    preview?: string,
+    response?: UploadResponse
+  ) => {
     setInvoiceData(data);
     setInvoiceId(id);
     setFilePath(path);
+    setPreviewId(preview || null);
+    setDocuments(response?.documents || []);
+    setFailedDocuments(response?.failed_documents || []);
+    setUploadWarning(response?.error || null);
     setCurrentStep('form');
     setError(null);
   };
 
+  const handleSelectDocument = async (splitDocument: SplitDocument) => {
+    try {
+      const data = await getInvoice(splitDocument.invoice_id);
+      setInvoiceData(data);
+      setInvoiceId(splitDocument.invoice_id);
+      setFilePath(splitDocument.file_path);
+      setPreviewId(splitDocument.preview_id);
+      setError(null);
+    } catch (err) {
+      console.error('Error loading invoice:', err);
+      setError(`Could not load the invoice on pages ${splitDocument.first_page}-${splitDocument.last_page}`);
+    }
+  };
+
   const handleUploadError = (errorMessage: string) => {
     setError(errorMessage);
   };
@@ -35,6 +67,10 @@ export default function Home() {
     setInvoiceData(null);
     setInvoiceId(null);
     setFilePath(null);
+    setPreviewId(null);
+    setDocuments([]);
+    setFailedDocuments([]);
+    setUploadWarning(null);
     setError(null);
   };
 
@@ -133,6 +169,49 @@ export default function Home() {
                     Upload Another Invoice
                   </button>
                 </div>
+
+                {/* Invoices of a multi-invoice PDF that could not be extracted */}
+                {(uploadWarning || failedDocuments.length > 0) && (
+                  <div className="p-4 bg-yellow-50 border border-yellow-200 rounded-md flex items-start">
+                    <FiAlertTriangle className="text-yellow-500 mt-0.5 mr-2 flex-shrink-0" />
+                    <div>
+                      <h4 className="font-medium text-yellow-800">Some invoices were not processed</h4>
+                      {uploadWarning && <p className="text-sm text-yellow-700">{uploadWarning}</p>}
+                      {failedDocuments.length > 0 && (
+                        <ul className="mt-2 text-sm text-yellow-700 list-disc pl-5 space-y-1">
+                          {failedDocuments.map(failed => (
+                            <li key={`${failed.first_page}-${failed.last_page}`}>
+                              Pages {failed.first_page}-{failed.last_page}: {failed.error}
+                            </li>
+                          ))}
+                        </ul>
+                      )}
+                      <p className="mt-2 text-sm text-yellow-700">
+                        Upload those pages again on their own to extract them.
+                      </p>
+                    </div>
+                  </div>
+                )}
+
+                {/* The uploaded PDF held several invoices; each one is reviewed separately */}
+                {documents.length > 1 && (
+                  <div className="p-4 bg-blue-50 border border-blue-100 rounded-md">
+                    <p className="text-sm text-blue-800 mb-3">
+                      {documents.length} invoices were extracted from this file. Select one to review it.
+                    </p>
+                    <div className="flex flex-wrap gap-2">
+                      {documents.map((splitDocument, index) => (
+                        <button
+                          key={splitDocument.invoice_id}
+                          onClick={() => handleSelectDocument(splitDocument)}
+                          className={`px-3 py-1 text-sm rounded-md border ${splitDocument.invoice_id === invoiceId ? 'bg-blue-600 text-white border-blue-600' : 'bg-white text-blue-700 border-blue-300 hover:bg-blue-100'}`}
+                        >
+                          Invoice {index + 1} (pages {splitDocument.first_page}-{splitDocument.last_page})
+                        </button>
+                      ))}
+                    </div>
+                  </div>
+                )}
                 
                 <div className="grid grid-cols-1 lg:grid-cols-2 gap-6">
                   {/* Left side: Original Invoice Viewer with zoom controls */}
@@ -140,327 +219,330 @@ export default function Home() {
                     <h3 className="text-lg font-medium text-gray-900 p-4 border-b border-gray-200">Original Invoice</h3>
                     
                     <div className="flex-1 min-h-[600px]">
-                      {filePath ? (
-                        filePath.endsWith('.pdf') ? (
-                          // Enhanced PDF Viewer with embedded viewer and fallback
-                          <div className="h-full w-full flex flex-col">
-                            <div className="bg-gray-100 p-3 flex items-center justify-between border-b border-gray-200">
-                              <span className="text-sm font-medium">PDF Document</span>
-                              <div className="flex space-x-2">
-                                <a 
-                                  href={`http://localhost:8081${filePath}`}
-                                  target="_blank"
-                                  rel="noopener noreferrer"
-                                  className="text-blue-600 text-sm hover:underline flex items-center"
-                                >
-                                  <svg xmlns="http://www.w3.org/2000/svg" className="h-4 w-4 mr-1" fill="none" viewBox="0 0 24 24" stroke="currentColor">
-                                    <path strokeLinecap="round" strokeLinejoin="round" strokeWidth={2} d="M10 6H6a2 2 0 00-2 2v10a2 2 0 002 2h10a2 2 0 002-2v-4M14 4h6m0 0v6m0-6L10 14" />
-                                  </svg>
-                                  Open in new tab
-                                </a>
-                              </div>
-                            </div>
-                            
-                            {/* Multi-approach PDF rendering with fallbacks */}
-                            <div className="flex-1 bg-gray-50 flex flex-col relative overflow-hidden">
-                              {/* Primary PDF viewer using object tag */}
-                              <object
-                                data={`http://localhost:8081${filePath}`}
-                                type="application/pdf"
-                                className="w-full h-full absolute inset-0 z-10"
-                                onError={(e) => {
-                                  // If object tag fails, we'll show the fallback iframe
-                                  const element = e.currentTarget;
-                                  element.style.display = 'none';
-                                  const fallbackIframe = document.getElementById('pdf-fallback-iframe');
-                                  if (fallbackIframe) fallbackIframe.style.display = 'block';
-                                }}
-                              >
-                                {/* This content shows if the object tag is not supported */}
-                                <p className="p-4 text-center">Your browser doesn&apos;t support embedded PDFs.</p>
-                              </object>
-                              
-                              {/* Fallback iframe approach */}
-                              <iframe
-                                id="pdf-fallback-iframe"
-                                src={`http://localhost:8081${filePath}`}
-                                className="w-full h-full absolute inset-0 z-5"
-                                style={{ display: 'none' }} // Hidden by default, shown if object fails
-                                onError={(e) => {
-                                  // If iframe fails too, show the ultimate fallback
-                                  const element = e.currentTarget;
-                                  element.style.display = 'none';
-                                  const ultimateFallback = document.getElementById('pdf-ultimate-fallback');
-                                  if (ultimateFallback) ultimateFallback.style.display = 'flex';
-                                }}
-                              ></iframe>
-                              
-                              {/* Ultimate fallback if both approaches fail */}
-                              <div 
-                                id="pdf-ultimate-fallback"
-                                className="w-full h-full absolute inset-0 flex flex-col items-center justify-center p-6"
-                                style={{ display: 'none' }} // Hidden by default
-                              >
-                                <div className="w-32 h-32 flex items-center justify-center rounded-full bg-blue-100 mb-4">
-                                  <svg xmlns="http://www.w3.org/2000/svg" className="h-16 w-16 text-blue-600" fill="none" viewBox="0 0 24 24" stroke="currentColor">
-                                    <path strokeLinecap="round" strokeLinejoin="round" strokeWidth={2} d="M9 12h6m-6 4h6m2 5H7a2 2 0 01-2-2V5a2 2 0 012-2h5.586a1 1 0 01.707.293l5.414 5.414a1 1 0 01.293.707V19a2 2 0 01-2 2z" />
-                                  </svg>
-                                </div>
-                                <p className="text-lg font-medium text-gray-800 mb-2">PDF Document Ready</p>
-                                <p className="text-gray-600 mb-6">Your browser cannot display this PDF directly.</p>
-                                <div className="flex space-x-4">
+                      {/* Page previews from the server, with the original file as a fallback if there are none */}
+                      <PreviewViewer previewId={previewId}>
+                        {filePath ? (
+                          filePath.endsWith('.pdf') ? (
+                            // Enhanced PDF Viewer with embedded viewer and fallback
+                            <div className="h-full w-full flex flex-col">
+                              <div className="bg-gray-100 p-3 flex items-center justify-between border-b border-gray-200">
+                                <span className="text-sm font-medium">PDF Document</span>
+                                <div className="flex space-x-2">
                                   <a 
                                     href={`http://localhost:8081${filePath}`}
                                     target="_blank"
                                     rel="noopener noreferrer"
-                                    className="px-4 py-2 bg-blue-600 text-white rounded-md hover:bg-blue-700 transition-colors flex items-center"
+                                    className="text-blue-600 text-sm hover:underline flex items-center"
                                   >
-                                    <svg xmlns="http://www.w3.org/2000/svg" className="h-5 w-5 mr-2" fill="none" viewBox="0 0 24 24" stroke="currentColor">
-                                      <path strokeLinecap="round" strokeLinejoin="round" strokeWidth={2} d="M15 12a3 3 0 11-6 0 3 3 0 016 0z" />
-                                      <path strokeLinecap="round" strokeLinejoin="round" strokeWidth={2} d="M2.458 12C3.732 7.943 7.523 5 12 5c4.478 0 8.268 2.943 9.542 7-1.274 4.057-5.064 7-9.542 7-4.477 0-8.268-2.943-9.542-7z" />
+                                    <svg xmlns="http://www.w3.org/2000/svg" className="h-4 w-4 mr-1" fill="none" viewBox="0 0 24 24" stroke="currentColor">
+                                      <path strokeLinecap="round" strokeLinejoin="round" strokeWidth={2} d="M10 6H6a2 2 0 00-2 2v10a2 2 0 002 2h10a2 2 0 002-2v-4M14 4h6m0 0v6m0-6L10 14" />
                                     </svg>
-                                    View PDF
+                                    Open in new tab
                                   </a>
                                 </div>
                               </div>
+                            
+                              {/* Multi-approach PDF rendering with fallbacks */}
+                              <div className="flex-1 bg-gray-50 flex flex-col relative overflow-hidden">
+                                {/* Primary PDF viewer using object tag */}
+                                <object
+                                  data={`http://localhost:8081${filePath}`}
+                                  type="application/pdf"
+                                  className="w-full h-full absolute inset-0 z-10"
+                                  onError={(e) => {
+                                    // If object tag fails, we'll show the fallback iframe
+                                    const element = e.currentTarget;
+                                    element.style.display = 'none';
+                                    const fallbackIframe = document.getElementById('pdf-fallback-iframe');
+                                    if (fallbackIframe) fallbackIframe.style.display = 'block';
+                                  }}
+                                >
+                                  {/* This content shows if the object tag is not supported */}
+                                  <p className="p-4 text-center">Your browser doesn&apos;t support embedded PDFs.</p>
+                                </object>
+                              
+                                {/* Fallback iframe approach */}
+                                <iframe
+                                  id="pdf-fallback-iframe"
+                                  src={`http://localhost:8081${filePath}`}
+                                  className="w-full h-full absolute inset-0 z-5"
+                                  style={{ display: 'none' }} // Hidden by default, shown if object fails
+                                  onError={(e) => {
+                                    // If iframe fails too, show the ultimate fallback
+                                    const element = e.currentTarget;
+                                    element.style.display = 'none';
+                                    const ultimateFallback = document.getElementById('pdf-ultimate-fallback');
+                                    if (ultimateFallback) ultimateFallback.style.display = 'flex';
+                                  }}
+                                ></iframe>
+                              
+                                {/* Ultimate fallback if both approaches fail */}
+                                <div 
+                                  id="pdf-ultimate-fallback"
+                                  className="w-full h-full absolute inset-0 flex flex-col items-center justify-center p-6"
+                                  style={{ display: 'none' }} // Hidden by default
+                                >
+                                  <div className="w-32 h-32 flex items-center justify-center rounded-full bg-blue-100 mb-4">
+                                    <svg xmlns="http://www.w3.org/2000/svg" className="h-16 w-16 text-blue-600" fill="none" viewBox="0 0 24 24" stroke="currentColor">
+                                      <path strokeLinecap="round" strokeLinejoin="round" strokeWidth={2} d="M9 12h6m-6 4h6m2 5H7a2 2 0 01-2-2V5a2 2 0 012-2h5.586a1 1 0 01.707.293l5.414 5.414a1 1 0 01.293.707V19a2 2 0 01-2 2z" />
+                                    </svg>
+                                  </div>
+                                  <p className="text-lg font-medium text-gray-800 mb-2">PDF Document Ready</p>
+                                  <p className="text-gray-600 mb-6">Your browser cannot display this PDF directly.</p>
+                                  <div className="flex space-x-4">
+                                    <a 
+                                      href={`http://localhost:8081${filePath}`}
+                                      target="_blank"
+                                      rel="noopener noreferrer"
+                                      className="px-4 py-2 bg-blue-600 text-white rounded-md hover:bg-blue-700 transition-colors flex items-center"
+                                    >
+                                      <svg xmlns="http://www.w3.org/2000/svg" className="h-5 w-5 mr-2" fill="none" viewBox="0 0 24 24" stroke="currentColor">
+                                        <path strokeLinecap="round" strokeLinejoin="round" strokeWidth={2} d="M15 12a3 3 0 11-6 0 3 3 0 016 0z" />
+                                        <path strokeLinecap="round" strokeLinejoin="round" strokeWidth={2} d="M2.458 12C3.732 7.943 7.523 5 12 5c4.478 0 8.268 2.943 9.542 7-1.274 4.057-5.064 7-9.542 7-4.477 0-8.268-2.943-9.542-7z" />
+                                      </svg>
+                                      View PDF
+                                    </a>
+                                  </div>
+                                </div>
+                              </div>
                             </div>
-                          </div>
-                        ) : (
-                          // Image Viewer with zoom and pan controls
-                          <div className="relative h-full w-full bg-gray-100 overflow-hidden">
-                            {/* Control panel */}
-                            <div className="absolute top-2 right-2 z-10 flex bg-white rounded-md shadow-md">
-                              {/* Rotation controls */}
-                              <button 
-                                onClick={() => {
-                                  const img = document.getElementById('invoice-image') as HTMLImageElement;
-                                  if (img) {
-                                    // Get current transform values
-                                    const style = window.getComputedStyle(img);
-                                    const matrix = new DOMMatrix(style.transform);
+                          ) : (
+                            // Image Viewer with zoom and pan controls
+                            <div className="relative h-full w-full bg-gray-100 overflow-hidden">
+                              {/* Control panel */}
+                              <div className="absolute top-2 right-2 z-10 flex bg-white rounded-md shadow-md">
+                                {/* Rotation controls */}
+                                <button 
+                                  onClick={() => {
+                                    const img = document.getElementById('invoice-image') as HTMLImageElement;
+                                    if (img) {
+                                      // Get current transform values
+                                      const style = window.getComputedStyle(img);
+                                      const matrix = new DOMMatrix(style.transform);
                                     
-                                    // Extract current rotation angle (if any)
-                                    let currentRotation = 0;
-                                    const transformValue = img.style.transform;
-                                    const rotateMatch = transformValue.match(/rotate\(([-0-9]+)deg\)/);
-                                    if (rotateMatch && rotateMatch[1]) {
-                                      currentRotation = parseInt(rotateMatch[1], 10);
-                                    }
+                                      // Extract current rotation angle (if any)
+                                      let currentRotation = 0;
+                                      const transformValue = img.style.transform;
+                                      const rotateMatch = transformValue.match(/rotate\(([-0-9]+)deg\)/);
+                                      if (rotateMatch && rotateMatch[1]) {
+                                        currentRotation = parseInt(rotateMatch[1], 10);
+                                      }
                                     
-                                    // Calculate new rotation (counter-clockwise)
-                                    const newRotation = ((currentRotation - 90) % 360);
-                                    
-                                    // Apply rotation while preserving other transforms
-                                    img.style.transform = `translate(${matrix.e}px, ${matrix.f}px) scale(${matrix.a}) rotate(${newRotation}deg)`;
-                                  }
-                                }}
-                                className="p-2 text-gray-700 hover:bg-gray-100"
-                                title="Rotate Counter-Clockwise"
-                              >
-                                ↺
-                              </button>
-                              <button 
-                                onClick={() => {
-                                  const img = document.getElementById('invoice-image') as HTMLImageElement;
-                                  if (img) {
-                                    // Get current transform values
-                                    const style = window.getComputedStyle(img);
-                                    const matrix = new DOMMatrix(style.transform);
+                                      // Calculate new rotation (counter-clockwise)
+                                      const newRotation = ((currentRotation - 90) % 360);
                                     
-                                    // Extract current rotation angle (if any)
-                                    let currentRotation = 0;
-                                    const transformValue = img.style.transform;
-                                    const rotateMatch = transformValue.match(/rotate\(([-0-9]+)deg\)/);
-                                    if (rotateMatch && rotateMatch[1]) {
-                                      currentRotation = parseInt(rotateMatch[1], 10);
+                                      // Apply rotation while preserving other transforms
+                                      img.style.transform = `translate(${matrix.e}px, ${matrix.f}px) scale(${matrix.a}) rotate(${newRotation}deg)`;
                                     }
+                                  }}
+                                  className="p-2 text-gray-700 hover:bg-gray-100"
+                                  title="Rotate Counter-Clockwise"
+                                >
+                                  ↺
+                                </button>
+                                <button 
+                                  onClick={() => {
+                                    const img = document.getElementById('invoice-image') as HTMLImageElement;
+                                    if (img) {
+                                      // Get current transform values
+                                      const style = window.getComputedStyle(img);
+                                      const matrix = new DOMMatrix(style.transform);
                                     
-                                    // Calculate new rotation (clockwise)
-                                    const newRotation = ((currentRotation + 90) % 360);
+                                      // Extract current rotation angle (if any)
+                                      let currentRotation = 0;
+                                      const transformValue = img.style.transform;
+                                      const rotateMatch = transformValue.match(/rotate\(([-0-9]+)deg\)/);
+                                      if (rotateMatch && rotateMatch[1]) {
+                                        currentRotation = parseInt(rotateMatch[1], 10);
+                                      }
                                     
-                                    // Apply rotation while preserving other transforms
-                                    img.style.transform = `translate(${matrix.e}px, ${matrix.f}px) scale(${matrix.a}) rotate(${newRotation}deg)`;
-                                  }
-                                }}
-                                className="p-2 text-gray-700 hover:bg-gray-100"
-                                title="Rotate Clockwise"
-                              >
-                                ↻
-                              </button>
+                                      // Calculate new rotation (clockwise)
+                                      const newRotation = ((currentRotation + 90) % 360);
+                                    
+                                      // Apply rotation while preserving other transforms
+                                      img.style.transform = `translate(${matrix.e}px, ${matrix.f}px) scale(${matrix.a}) rotate(${newRotation}deg)`;
+                                    }
+                                  }}
+                                  className="p-2 text-gray-700 hover:bg-gray-100"
+                                  title="Rotate Clockwise"
+                                >
+                                  ↻
+                                </button>
                               
-                              {/* Separator */}
-                              <div className="border-l border-gray-200 mx-1"></div>
+                                {/* Separator */}
+                                <div className="border-l border-gray-200 mx-1"></div>
                               
-                              {/* Zoom controls */}
-                              <button 
-                                onClick={() => {
-                                  const container = document.getElementById('image-container') as HTMLDivElement;
-                                  const img = document.getElementById('invoice-image') as HTMLImageElement;
-                                  if (img && container) {
-                                    // Get current transform values
-                                    const style = window.getComputedStyle(img);
-                                    const matrix = new DOMMatrix(style.transform);
-                                    const scale = Math.max(matrix.a - 0.2, 0.5); // a is the x-scale
+                                {/* Zoom controls */}
+                                <button 
+                                  onClick={() => {
+                                    const container = document.getElementById('image-container') as HTMLDivElement;
+                                    const img = document.getElementById('invoice-image') as HTMLImageElement;
+                                    if (img && container) {
+                                      // Get current transform values
+                                      const style = window.getComputedStyle(img);
+                                      const matrix = new DOMMatrix(style.transform);
+                                      const scale = Math.max(matrix.a - 0.2, 0.5); // a is the x-scale
+                                    
+                                      // Extract current rotation angle (if any)
+                                      let currentRotation = 0;
+                                      const transformValue = img.style.transform;
+                                      const rotateMatch = transformValue.match(/rotate\(([-0-9]+)deg\)/);
+                                      if (rotateMatch && rotateMatch[1]) {
+                                        currentRotation = parseInt(rotateMatch[1], 10);
+                                      }
                                     
-                                    // Extract current rotation angle (if any)
-                                    let currentRotation = 0;
-                                    const transformValue = img.style.transform;
-                                    const rotateMatch = transformValue.match(/rotate\(([-0-9]+)deg\)/);
-                                    if (rotateMatch && rotateMatch[1]) {
-                                      currentRotation = parseInt(rotateMatch[1], 10);
+                                      // Apply new scale while preserving translation and rotation
+                                      img.style.transform = `translate(${matrix.e}px, ${matrix.f}px) scale(${scale}) rotate(${currentRotation}deg)`;
+                                    }
+                                  }}
+                                  className="p-2 text-gray-700 hover:bg-gray-100"
+                                  title="Zoom Out"
+                                >
+                                  -
+                                </button>
+                                <button 
+                                  onClick={() => {
+                                    const img = document.getElementById('invoice-image') as HTMLImageElement;
+                                    if (img) {
+                                      // Reset zoom and position but keep rotation if any
+                                      img.style.transform = 'translate(0px, 0px) scale(1) rotate(0deg)';
                                     }
+                                  }}
+                                  className="p-2 text-gray-700 hover:bg-gray-100"
+                                  title="Reset View"
+                                >
+                                  ⟲
+                                </button>
+                                <button 
+                                  onClick={() => {
+                                    const container = document.getElementById('image-container') as HTMLDivElement;
+                                    const img = document.getElementById('invoice-image') as HTMLImageElement;
+                                    if (img && container) {
+                                      // Get current transform values
+                                      const style = window.getComputedStyle(img);
+                                      const matrix = new DOMMatrix(style.transform);
+                                      const scale = Math.min(matrix.a + 0.2, 3); // a is the x-scale
                                     
-                                    // Apply new scale while preserving translation and rotation
-                                    img.style.transform = `translate(${matrix.e}px, ${matrix.f}px) scale(${scale}) rotate(${currentRotation}deg)`;
-                                  }
-                                }}
-                                className="p-2 text-gray-700 hover:bg-gray-100"
-                                title="Zoom Out"
-                              >
-                                -
-                              </button>
-                              <button 
-                                onClick={() => {
-                                  const img = document.getElementById('invoice-image') as HTMLImageElement;
-                                  if (img) {
-                                    // Reset zoom and position but keep rotation if any
-                                    img.style.transform = 'translate(0px, 0px) scale(1) rotate(0deg)';
-                                  }
-                                }}
-                                className="p-2 text-gray-700 hover:bg-gray-100"
-                                title="Reset View"
-                              >
-                                ⟲
-                              </button>
-                              <button 
-                                onClick={() => {
-                                  const container = document.getElementById('image-container') as HTMLDivElement;
-                                  const img = document.getElementById('invoice-image') as HTMLImageElement;
-                                  if (img && container) {
-                                    // Get current transform values
-                                    const style = window.getComputedStyle(img);
-                                    const matrix = new DOMMatrix(style.transform);
-                                    const scale = Math.min(matrix.a + 0.2, 3); // a is the x-scale
+                                      // Extract current rotation angle (if any)
+                                      let currentRotation = 0;
+                                      const transformValue = img.style.transform;
+                                      const rotateMatch = transformValue.match(/rotate\(([-0-9]+)deg\)/);
+                                      if (rotateMatch && rotateMatch[1]) {
+                                        currentRotation = parseInt(rotateMatch[1], 10);
+                                      }
                                     
-                                    // Extract current rotation angle (if any)
-                                    let currentRotation = 0;
-                                    const transformValue = img.style.transform;
-                                    const rotateMatch = transformValue.match(/rotate\(([-0-9]+)deg\)/);
-                                    if (rotateMatch && rotateMatch[1]) {
-                                      currentRotation = parseInt(rotateMatch[1], 10);
+                                      // Apply new scale while preserving translation and rotation
+                                      img.style.transform = `translate(${matrix.e}px, ${matrix.f}px) scale(${scale}) rotate(${currentRotation}deg)`;
                                     }
-                                    
-                                    // Apply new scale while preserving translation and rotation
-                                    img.style.transform = `translate(${matrix.e}px, ${matrix.f}px) scale(${scale}) rotate(${currentRotation}deg)`;
-                                  }
-                                }}
-                                className="p-2 text-gray-700 hover:bg-gray-100"
-                                title="Zoom In"
-                              >
-                                +
-                              </button>
-                            </div>
+                                  }}
+                                  className="p-2 text-gray-700 hover:bg-gray-100"
+                                  title="Zoom In"
+                                >
+                                  +
+                                </button>
+                              </div>
                             
-                            {/* Instructions tooltip */}
-                            <div className="absolute bottom-2 left-2 z-10 bg-white bg-opacity-80 text-xs text-gray-700 p-2 rounded-md shadow-sm">
-                              Drag to move image • Scroll to zoom • Use ↺/↻ to rotate
-                            </div>
+                              {/* Instructions tooltip */}
+                              <div className="absolute bottom-2 left-2 z-10 bg-white bg-opacity-80 text-xs text-gray-700 p-2 rounded-md shadow-sm">
+                                Drag to move image • Scroll to zoom • Use ↺/↻ to rotate
+                              </div>
                             
-                            {/* Image container with pan/zoom functionality */}
-                            <div 
-                              id="image-container"
-                              className="h-full w-full flex items-center justify-center"
-                              onMouseDown={(e) => {
-                                // Start dragging
-                                const container = e.currentTarget;
-                                const img = document.getElementById('invoice-image') as HTMLImageElement;
-                                if (!img) return;
+                              {/* Image container with pan/zoom functionality */}
+                              <div 
+                                id="image-container"
+                                className="h-full w-full flex items-center justify-center"
+                                onMouseDown={(e) => {
+                                  // Start dragging
+                                  const container = e.currentTarget;
+                                  const img = document.getElementById('invoice-image') as HTMLImageElement;
+                                  if (!img) return;
                                 
-                                // Get current transform values
-                                const style = window.getComputedStyle(img);
-                                const matrix = new DOMMatrix(style.transform);
+                                  // Get current transform values
+                                  const style = window.getComputedStyle(img);
+                                  const matrix = new DOMMatrix(style.transform);
                                 
-                                // Store initial position
-                                const startX = e.clientX;
-                                const startY = e.clientY;
-                                const startTranslateX = matrix.e;
-                                const startTranslateY = matrix.f;
+                                  // Store initial position
+                                  const startX = e.clientX;
+                                  const startY = e.clientY;
+                                  const startTranslateX = matrix.e;
+                                  const startTranslateY = matrix.f;
                                 
-                                // Set cursor style
-                                container.style.cursor = 'grabbing';
+                                  // Set cursor style
+                                  container.style.cursor = 'grabbing';
                                 
-                                // Handle mouse move
-                                const handleMouseMove = (moveEvent: MouseEvent) => {
-                                  const dx = moveEvent.clientX - startX;
-                                  const dy = moveEvent.clientY - startY;
+                                  // Handle mouse move
+                                  const handleMouseMove = (moveEvent: MouseEvent) => {
+                                    const dx = moveEvent.clientX - startX;
+                                    const dy = moveEvent.clientY - startY;
                                   
-                                  // Apply translation while preserving scale
-                                  img.style.transform = `translate(${startTranslateX + dx}px, ${startTranslateY + dy}px) scale(${matrix.a})`;
-                                };
+                                    // Apply translation while preserving scale
+                                    img.style.transform = `translate(${startTranslateX + dx}px, ${startTranslateY + dy}px) scale(${matrix.a})`;
+                                  };
                                 
-                                // Handle mouse up
-                                const handleMouseUp = () => {
-                                  document.removeEventListener('mousemove', handleMouseMove);
-                                  document.removeEventListener('mouseup', handleMouseUp);
-                                  container.style.cursor = 'grab';
-                                };
+                                  // Handle mouse up
+                                  const handleMouseUp = () => {
+                                    document.removeEventListener('mousemove', handleMouseMove);
+                                    document.removeEventListener('mouseup', handleMouseUp);
+                                    container.style.cursor = 'grab';
+                                  };
                                 
-                                // Add event listeners
-                                document.addEventListener('mousemove', handleMouseMove);
-                                document.addEventListener('mouseup', handleMouseUp);
-                              }}
-                              onWheel={(e) => {
-                                e.preventDefault();
-                                const img = document.getElementById('invoice-image') as HTMLImageElement;
-                                if (!img) return;
+                                  // Add event listeners
+                                  document.addEventListener('mousemove', handleMouseMove);
+                                  document.addEventListener('mouseup', handleMouseUp);
+                                }}
+                                onWheel={(e) => {
+                                  e.preventDefault();
+                                  const img = document.getElementById('invoice-image') as HTMLImageElement;
+                                  if (!img) return;
                                 
-                                // Get current transform values
-                                const style = window.getComputedStyle(img);
-                                const matrix = new DOMMatrix(style.transform);
+                                  // Get current transform values
+                                  const style = window.getComputedStyle(img);
+                                  const matrix = new DOMMatrix(style.transform);
                                 
-                                // Calculate new scale based on wheel direction
-                                const delta = e.deltaY > 0 ? -0.1 : 0.1;
-                                const newScale = Math.max(0.5, Math.min(3, matrix.a + delta));
+                                  // Calculate new scale based on wheel direction
+                                  const delta = e.deltaY > 0 ? -0.1 : 0.1;
+                                  const newScale = Math.max(0.5, Math.min(3, matrix.a + delta));
                                 
-                                // Apply new scale while preserving translation
-                                img.style.transform = `translate(${matrix.e}px, ${matrix.f}px) scale(${newScale})`;
-                              }}
-                              style={{ cursor: 'grab' }}
-                            >
-                              <Image 
-                                id="invoice-image"
-                                src={`http://localhost:8081${filePath}`} 
-                                alt="Invoice Image" 
-                                width={800}
-                                height={1000}
-                                className="max-h-full max-w-full object-contain transition-transform duration-100"
-                                style={{ transformOrigin: 'center', transform: 'translate(0px, 0px) scale(1) rotate(0deg)' }}
-                                onError={(e) => {
-                                  const imgElement = e.currentTarget as HTMLImageElement;
-                                  imgElement.onerror = null;
-                                  console.error('Failed to load image');
+                                  // Apply new scale while preserving translation
+                                  img.style.transform = `translate(${matrix.e}px, ${matrix.f}px) scale(${newScale})`;
                                 }}
-                                draggable={false}
-                                unoptimized={true} // Needed for external URLs
-                              />
+                                style={{ cursor: 'grab' }}
+                              >
+                                <Image 
+                                  id="invoice-image"
+                                  src={`http://localhost:8081${filePath}`} 
+                                  alt="Invoice Image" 
+                                  width={800}
+                                  height={1000}
+                                  className="max-h-full max-w-full object-contain transition-transform duration-100"
+                                  style={{ transformOrigin: 'center', transform: 'translate(0px, 0px) scale(1) rotate(0deg)' }}
+                                  onError={(e) => {
+                                    const imgElement = e.currentTarget as HTMLImageElement;
+                                    imgElement.onerror = null;
+                                    console.error('Failed to load image');
+                                  }}
+                                  draggable={false}
+                                  unoptimized={true} // Needed for external URLs
+                                />
+                              </div>
                             </div>
-                          </div>
-                        )
-                      ) : (
-                        <div className="flex flex-col items-center justify-center p-8 bg-gray-50 h-full">
-                          <div className="mb-6">
-                            <div className="w-32 h-32 flex items-center justify-center rounded-full bg-blue-100">
-                              <svg xmlns="http://www.w3.org/2000/svg" className="h-16 w-16 text-blue-600" fill="none" viewBox="0 0 24 24" stroke="currentColor">
-                                <path strokeLinecap="round" strokeLinejoin="round" strokeWidth={2} d="M9 12h6m-6 4h6m2 5H7a2 2 0 01-2-2V5a2 2 0 012-2h5.586a1 1 0 01.707.293l5.414 5.414a1 1 0 01.293.707V19a2 2 0 01-2 2z" />
-                              </svg>
+                          )
+                        ) : (
+                          <div className="flex flex-col items-center justify-center p-8 bg-gray-50 h-full">
+                            <div className="mb-6">
+                              <div className="w-32 h-32 flex items-center justify-center rounded-full bg-blue-100">
+                                <svg xmlns="http://www.w3.org/2000/svg" className="h-16 w-16 text-blue-600" fill="none" viewBox="0 0 24 24" stroke="currentColor">
+                                  <path strokeLinecap="round" strokeLinejoin="round" strokeWidth={2} d="M9 12h6m-6 4h6m2 5H7a2 2 0 01-2-2V5a2 2 0 012-2h5.586a1 1 0 01.707.293l5.414 5.414a1 1 0 01.293.707V19a2 2 0 01-2 2z" />
+                                </svg>
+                              </div>
+                            </div>
+                            <div className="text-center">
+                              <p className="text-lg font-medium text-gray-800 mb-2">No Invoice Available</p>
+                              <p className="text-gray-600 mb-4">Upload an invoice to view it here</p>
                             </div>
                           </div>
-                          <div className="text-center">
-                            <p className="text-lg font-medium text-gray-800 mb-2">No Invoice Available</p>
-                            <p className="text-gray-600 mb-4">Upload an invoice to view it here</p>
-                          </div>
-                        </div>
-                      )}
+                        )}
+                      </PreviewViewer>
                     </div>
                     
                     {/* Download button for the invoice */}
@@ -485,6 +567,7 @@ export default function Home() {
                     <h3 className="text-lg font-medium text-gray-900 p-4 border-b border-gray-200">Extracted Data</h3>
                     <div className="flex-1 overflow-auto">
                       <InvoiceForm
+                        key={invoiceId} // Reset the form when switching between split invoices
                         invoiceData={invoiceData}
                         invoiceId={invoiceId}
                         onSaveSuccess={handleSaveSuccess}
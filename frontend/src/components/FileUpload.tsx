@@ -2,10 +2,16 @@ import React, { useState, useCallback } from 'react';
 import { useDropzone } from 'react-dropzone';
 import { FiUpload, FiFile, FiAlertCircle } from 'react-icons/fi';
 import { uploadInvoice } from '../services/api';
-import { InvoiceData } from '../types/invoice';
+import { InvoiceData, UploadResponse } from '../types/invoice';
 
 interface FileUploadProps {
-  onUploadSuccess: (data: InvoiceData, invoiceId: string, filePath: string) => void;
+  onUploadSuccess: (
+    data: InvoiceData,
+    invoiceId: string,
+    filePath: string,
+    previewId?: string,
+    response?: UploadResponse // Split documents and partial failures of a multi-invoice PDF
+  ) => void;
   onUploadError: (error: string) => void;
 }
 
@@ -95,7 +101,7 @@ const FileUpload: React.FC<FileUploadProps> = ({ onUploadSuccess, onUploadError
       if (response.success && response.data && response.invoice_id) {
         setProcessingStatus('Processing complete! Displaying results...');
         
-        // Check if the response contains an error message despite success flag
+        // A multi-invoice PDF can succeed with some invoices missing; the page shows that to the user
         if (response.error) {
           console.warn('Warning: Response marked as success but contains error:', response.error);
         }
@@ -108,7 +114,13 @@ const FileUpload: React.FC<FileUploadProps> = ({ onUploadSuccess, onUploadError
         }
         
         // Pass the file path for display
-        onUploadSuccess(response.data, response.invoice_id, response.file_path || '');
+        onUploadSuccess(
+          response.data,
+          response.invoice_id,
+          response.file_path || '',
+          response.preview_id,
+          response
+        );
       } else {
         throw new Error(response.error || 'Unknown error occurred');
       }
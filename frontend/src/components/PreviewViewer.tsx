@@ -0,0 +1,183 @@
+import React, { useEffect, useState } from 'react';
+import Image from 'next/image';
+import { getPreviewAssetUrl, getPreviewManifest } from '../services/api';
+import { PreviewManifest } from '../types/invoice';
+
+// Previews are rendered after the upload response is sent, so poll until the manifest exists
+const MANIFEST_POLL_INTERVAL = 1000;
+const MANIFEST_POLL_ATTEMPTS = 30;
+
+// Displayed page width at 100% zoom
+const BASE_WIDTH = 600;
+
+// Largest thumbnail; wider than this, the page is drawn from zoom tiles
+const THUMBNAIL_WIDTH = 1024;
+
+interface PreviewViewerProps {
+  previewId?: string | null;
+  children?: React.ReactNode; // Shown when there are no previews for this file
+}
+
+const PreviewViewer: React.FC<PreviewViewerProps> = ({ previewId, children }) => {
+  const [manifest, setManifest] = useState<PreviewManifest | null>(null);
+  const [pageIndex, setPageIndex] = useState<number>(0);
+  const [scale, setScale] = useState<number>(1.0);
+  const [unavailable, setUnavailable] = useState<boolean>(false);
+
+  useEffect(() => {
+    // Reset state when the preview changes
+    setManifest(null);
+    setPageIndex(0);
+    setScale(1.0);
+    setUnavailable(false);
+    if (!previewId) return;
+
+    let cancelled = false;
+    let attempts = 0;
+    let timer: ReturnType<typeof setTimeout> | undefined;
+    const loadManifest = async () => {
+      try {
+        const result = await getPreviewManifest(previewId);
+        if (!cancelled) setManifest(result);
+      } catch {
+        attempts += 1;
+        if (cancelled) return;
+        if (attempts < MANIFEST_POLL_ATTEMPTS) {
+          timer = setTimeout(loadManifest, MANIFEST_POLL_INTERVAL);
+        } else {
+          setUnavailable(true);
+        }
+      }
+    };
+    loadManifest();
+
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [previewId]);
+
+  if (!previewId || unavailable || manifest?.pages.length === 0) {
+    return <>{children}</>;
+  }
+
+  if (!manifest) {
+    // Wait for the previews rather than downloading the full original file
+    return (
+      <div className="flex items-center justify-center h-full bg-gray-200">
+        <div className="animate-spin rounded-full h-12 w-12 border-b-2 border-blue-700"></div>
+      </div>
+    );
+  }
+
+  const page = manifest.pages[pageIndex];
+  const width = Math.round(BASE_WIDTH * scale);
+  const height = Math.round((width * page.height) / page.width);
+  const ratio = width / page.width;
+
+  function changePage(offset: number) {
+    setPageIndex(prevPageIndex => {
+      const newPageIndex = prevPageIndex + offset;
+      return newPageIndex >= 0 && newPageIndex < manifest!.pages.length ? newPageIndex : prevPageIndex;
+    });
+  }
+
+  function renderTiles() {
+    const { size, rows, columns, path } = page.tiles;
+    const tiles: React.ReactNode[] = [];
+    for (let row = 0; row < rows; row++) {
+      for (let column = 0; column < columns; column++) {
+        const tileWidth = Math.min(size, page.width - column * size);
+        const tileHeight = Math.min(size, page.height - row * size);
+        const asset = path.replace('{row}', String(row)).replace('{column}', String(column));
+        tiles.push(
+          <Image
+            key={`${row}_${column}`}
+            src={getPreviewAssetUrl(previewId!, asset)}
+            alt=""
+            width={Math.ceil(tileWidth * ratio)}
+            height={Math.ceil(tileHeight * ratio)}
+            className="absolute max-w-none"
+            style={{ left: Math.floor(column * size * ratio), top: Math.floor(row * size * ratio) }}
+            unoptimized={true} // Tiles are already sized for display
+            draggable={false}
+          />
+        );
+      }
+    }
+    return tiles;
+  }
+
+  return (
+    <div className="preview-viewer flex flex-col h-full">
+      {/* Controls */}
+      <div className="bg-gray-100 p-3 flex flex-wrap items-center justify-between gap-2 border-b border-gray-300">
+        <div className="flex items-center space-x-2">
+          <button
+            onClick={() => changePage(-1)}
+            disabled={pageIndex <= 0}
+            className="px-2 py-1 bg-white border border-gray-300 rounded-md disabled:opacity-50"
+          >
+            Previous
+          </button>
+          <span className="text-sm">
+            Page {pageIndex + 1} of {manifest.page_count}
+          </span>
+          <button
+            onClick={() => changePage(1)}
+            disabled={pageIndex >= manifest.pages.length - 1}
+            className="px-2 py-1 bg-white border border-gray-300 rounded-md disabled:opacity-50"
+          >
+            Next
+          </button>
+        </div>
+
+        <div className="flex items-center space-x-2">
+          <button
+            onClick={() => setScale(prevScale => Math.max(prevScale - 0.2, 0.5))}
+            className="px-2 py-1 bg-white border border-gray-300 rounded-md"
+            title="Zoom Out"
+          >
+            -
+          </button>
+          <span className="text-sm">{Math.round(scale * 100)}%</span>
+          <button
+            onClick={() => setScale(prevScale => Math.min(prevScale + 0.2, 3.0))}
+            className="px-2 py-1 bg-white border border-gray-300 rounded-md"
+            title="Zoom In"
+          >
+            +
+          </button>
+          <button
+            onClick={() => setScale(1.0)}
+            className="px-2 py-1 bg-white border border-gray-300 rounded-md text-xs"
+            title="Reset Zoom"
+          >
+            Reset
+          </button>
+        </div>
+      </div>
+
+      {/* Page, drawn from a thumbnail or, when zoomed past it, from lazily loaded tiles */}
+      <div className="flex-1 overflow-auto bg-gray-200 p-4">
+        <div className="relative mx-auto shadow-lg bg-white" style={{ width, height }}>
+          {width > THUMBNAIL_WIDTH ? (
+            renderTiles()
+          ) : (
+            <Image
+              src={getPreviewAssetUrl(previewId, page.thumbnails[String(THUMBNAIL_WIDTH)])}
+              alt={`Invoice page ${pageIndex + 1}`}
+              width={width}
+              height={height}
+              className="max-w-none"
+              unoptimized={true} // Thumbnails are already sized for display
+              draggable={false}
+            />
+          )}
+        </div>
+      </div>
+    </div>
+  );
+};
+
+export default PreviewViewer;
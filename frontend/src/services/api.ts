@@ -1,5 +1,5 @@
 import axios from 'axios';
-import { InvoiceData, UploadResponse } from '../types/invoice';
+import { InvoiceData, PreviewManifest, UploadResponse } from '../types/invoice';
 
 const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8081/api';
 
@@ -147,6 +147,15 @@ export const getInvoice = async (invoiceId: string): Promise<InvoiceData> => {
   return response.data;
 };
 
+export const getPreviewManifest = async (previewId: string): Promise<PreviewManifest> => {
+  const response = await api.get<PreviewManifest>(`/previews/${previewId}`);
+  return response.data;
+};
+
+// Thumbnails and tiles are addressed relative to the preview they belong to
+export const getPreviewAssetUrl = (previewId: string, assetPath: string): string =>
+  `${API_URL}/previews/${previewId}/${assetPath}`;
+
 export const submitCorrections = async (
   invoiceId: string, 
   correctedData: InvoiceData, 
@@ -84,4 +84,41 @@ export interface UploadResponse {
   invoice_id?: string;
   file_path?: string;
   file_type?: string;
+  preview_id?: string;
+  documents?: SplitDocument[];
+  failed_documents?: FailedDocument[];
+}
+
+export interface SplitDocument {
+  invoice_id: string;
+  first_page: number;
+  last_page: number;
+  file_path: string;
+  preview_id: string;
+  source_id: string;
+  source_file_path: string;
+}
+
+export interface FailedDocument {
+  first_page: number;
+  last_page: number;
+  error: string;
+}
+
+export interface PreviewPage {
+  width: number;
+  height: number;
+  thumbnails: Record<string, string>;
+  tiles: {
+    size: number;
+    rows: number;
+    columns: number;
+    path: string;
+  };
+}
+
+export interface PreviewManifest {
+  id: string;
+  page_count: number;
+  pages: PreviewPage[];
 }
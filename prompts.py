@@ -177,3 +177,30 @@ closer to totals section or labeled with stronger semantic cues).
 
 Ready for extraction.
 """
+
+# Vendor and customer blocks of the output schema above
+_PARTIES_SCHEMA = INVOICE_PROMPT[INVOICE_PROMPT.index('  "vendor": {'):INVOICE_PROMPT.index('  "line_items": [],')]
+
+# Variant used when the vendor is already known from the vendor profile cache.
+# The stable vendor and customer fields are filled in from the cache, so the
+# model only returns enough of the vendor to confirm the match.
+KNOWN_VENDOR_PROMPT = INVOICE_PROMPT.replace(
+    _PARTIES_SCHEMA,
+    '''  "vendor_check": {
+    "name": null,
+    "tax_id": null
+  },
+''',
+).replace(
+    "Ready for extraction.",
+    """### KNOWN VENDOR
+
+The vendor and customer details for this invoice are already on file. Do **not**
+return the `vendor` or `customer` objects. Instead return `vendor_check` with the
+vendor name and tax ID exactly as printed on the document, so the match can be
+verified.
+
+---
+
+Ready for extraction.""",
+)